@@ -1,7 +1,25 @@
-from .dataset_loader import DataItem, MyDataset
+from typing import TYPE_CHECKING, Any
+
+
+if TYPE_CHECKING:
+    from .dataset_loader import MyDataset
+    from .recording import DataItem
 
 
 __all__ = [
     "DataItem",
     "MyDataset",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    # submodules are imported on first access (PEP 562), torch with `MyDataset`
+    if name == "DataItem":
+        from . import recording
+
+        return recording.DataItem
+    if name == "MyDataset":
+        from . import dataset_loader
+
+        return dataset_loader.MyDataset
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
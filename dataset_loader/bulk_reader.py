@@ -0,0 +1,125 @@
+"""
+Bulk reader of many small files (depth frames, observations).
+
+Files are read in batches by a small thread pool: the files of a batch are read
+in the order of their inodes (which approximates the on-disk order on most
+filesystems), and several batches are in flight, so that the reads of the next
+batches overlap with the decoding of the current one. When the reads of a batch
+are queued, the kernel is asked to read ahead the files of the following batch
+(`posix_fadvise`). Contents are yielded in the requested order.
+"""
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Tuple
+
+
+READ_WORKERS = 4
+BATCH_SIZE = 64  # files
+BATCHES_IN_FLIGHT = 2
+
+_Batch = Tuple[List[Path], Dict[Path, "Future[bytes]"]]
+
+
+def read_file(path: Path) -> bytes:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks: List[bytes] = []
+        while True:
+            chunk = os.read(fd, 1 << 20)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+
+def advise_will_need(path: Path) -> None:
+    """
+    Starts reading the file into the page cache in the background (no-op where
+    `posix_fadvise` is not available, e.g. on macOS and Windows).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # fails when read
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+class BulkFileReader:
+    def __init__(
+        self,
+        workers: int = READ_WORKERS,
+        batch_size: int = BATCH_SIZE,
+        batches_in_flight: int = BATCHES_IN_FLIGHT,
+    ) -> None:
+        if min(workers, batch_size, batches_in_flight) < 1:
+            raise ValueError(
+                "Expect positive number of workers, batch size and batches "
+                f"in flight, got: {workers}, {batch_size}, {batches_in_flight}"
+            )
+        self._workers = workers
+        self._batch_size = batch_size
+        self._batches_in_flight = batches_in_flight
+        self._inodes: Dict[Path, Dict[str, int]] = {}  # by directory
+
+    def _inode(self, path: Path) -> int:
+        directory = path.parent
+        if directory not in self._inodes:
+            # a single scan of the directory gives inodes of all files for free
+            try:
+                with os.scandir(directory) as entries:
+                    inodes = {entry.name: entry.inode() for entry in entries}
+            except OSError:
+                inodes = {}  # fails when read
+            self._inodes[directory] = inodes
+        inodes = self._inodes[directory]
+        if path.name not in inodes:  # created after the scan
+            try:
+                inodes[path.name] = os.stat(path).st_ino
+            except OSError:
+                return 0  # fails when read
+        return inodes[path.name]
+
+    def _submit(
+        self, executor: ThreadPoolExecutor, batch: List[Path], next_batch: List[Path]
+    ) -> _Batch:
+        unique = sorted(set(batch), key=self._inode)
+        futures = {path: executor.submit(read_file, path) for path in unique}
+        # read ahead while this batch is being read, the next reads hit the cache
+        for path in sorted(set(next_batch) - set(batch), key=self._inode):
+            advise_will_need(path)
+        return batch, futures
+
+    def read(self, paths: Iterable[Path]) -> Iterator[bytes]:
+        """
+        Yields contents of `paths` in the same order (a file requested several
+        times within a batch is read once). Raises OSError of the first file
+        which could not be read when it is reached. `paths` are consumed up to
+        a batch ahead of the batches in flight.
+        """
+        paths = iter(paths)
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            pending: Deque[_Batch] = deque()
+            batch = list(islice(paths, self._batch_size))
+            while batch:
+                next_batch = list(islice(paths, self._batch_size))
+                pending.append(self._submit(executor, batch, next_batch))
+                if len(pending) >= self._batches_in_flight:
+                    yield from self._results(pending.popleft())
+                batch = next_batch
+            while pending:
+                yield from self._results(pending.popleft())
+
+    @staticmethod
+    def _results(batch: _Batch) -> Iterator[bytes]:
+        paths, futures = batch
+        for path in paths:
+            yield futures[path].result()
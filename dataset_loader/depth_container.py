@@ -0,0 +1,292 @@
+"""
+Single-file container for depth frames.
+
+Frames are stored in chunks of `chunk_size` consecutive frames (in the order of
+`per_frame_timestamps.txt`). Each chunk is delta-coded along time (the difference
+to the previous frame, wrapping around the integer type, so decoding is exact)
+and compressed with the fastest available codec. The file layout is:
+
+    MAGIC | index offset (u64 LE) | chunk 0 | chunk 1 | ... | index (JSON)
+
+where the index maps frame ids to positions and holds byte ranges of the chunks,
+so that reading a chunk (several consecutive aligned samples) is a single read.
+"""
+import argparse
+import json
+import logging
+import os
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from dataset_loader.recording import (
+    DEPTH_META_REL_PATH,
+    DepthFrameMeta,
+    depth_pixels,
+    read_depth_frames_meta,
+)
+
+
+logger = logging.getLogger(__name__)
+
+DEPTH_CONTAINER_FILE_NAME = "frames.depthpack"
+MAGIC = b"DLDEPTH1"
+_HEADER = struct.Struct("<8sQ")
+
+CHUNK_SIZE = 16  # frames
+CHUNK_CACHE_SIZE = 2  # chunks
+CODECS = ("zstd", "lz4", "zlib", "none")  # by preference
+
+
+def available_codecs() -> List[str]:
+    codecs = []
+    for codec in CODECS:
+        try:
+            _codec_module(codec)
+        except ImportError:
+            continue
+        codecs.append(codec)
+    return codecs
+
+
+def _codec_module(codec: str) -> Any:
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard
+    if codec == "lz4":
+        import lz4.frame
+
+        return lz4.frame
+    if codec in ("zlib", "none"):
+        return zlib
+    raise ValueError(f"Unknown codec {codec}, expect one of {CODECS}")
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    module = _codec_module(codec)
+    if codec == "zstd":
+        return module.ZstdCompressor(level=3).compress(data)
+    if codec == "lz4":
+        return module.compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 1)
+    return data
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    module = _codec_module(codec)
+    if codec == "zstd":
+        return module.ZstdDecompressor().decompress(data)
+    if codec == "lz4":
+        return module.decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def _delta_encode(frames: np.ndarray) -> np.ndarray:
+    deltas = frames.copy()
+    deltas[1:] -= frames[:-1]  # wraps around for integer types
+    return deltas
+
+
+def _delta_decode(deltas: np.ndarray) -> np.ndarray:
+    return np.cumsum(deltas, axis=0, dtype=deltas.dtype)
+
+
+def _load_image(frame: DepthFrameMeta) -> np.ndarray:
+    from PIL import Image
+
+    path = frame.file_path
+    try:
+        with Image.open(path) as img:
+            return np.asarray(img)
+    except (ValueError, OSError) as e:
+        raise ValueError(f"Could not load depth frame file `{path}`: {e}") from e
+
+
+def convert_depth_frames(
+    meta_file: Path,
+    out_path: Optional[Path] = None,
+    *,
+    chunk_size: int = CHUNK_SIZE,
+    codec: Optional[str] = None,
+    delta: bool = True,
+) -> Path:
+    """
+    Packs the depth frames listed in `meta_file` into a container (by default,
+    `DEPTH_CONTAINER_FILE_NAME` next to the meta file). Returns the path.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Chunk size must be positive, got: {chunk_size}")
+    codec = codec or available_codecs()[0]
+    _codec_module(codec)  # fail early for unavailable codecs
+    out_path = out_path or meta_file.parent / DEPTH_CONTAINER_FILE_NAME
+    frames_meta = list(read_depth_frames_meta(meta_file).values())
+
+    ids: List[int] = []
+    chunks: List[Tuple[int, int]] = []  # (offset, nbytes)
+    shape: Optional[Tuple[int, ...]] = None
+    dtype: Optional[np.dtype] = None
+    # written to a temporary file first, so that readers never see partial data
+    fd, tmp_path = tempfile.mkstemp(dir=out_path.parent, prefix=out_path.name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, 0))
+            for start in range(0, len(frames_meta), chunk_size):
+                end = start + chunk_size
+                chunk_meta = frames_meta[start:end]
+                frames = np.stack([_load_image(frame) for frame in chunk_meta])
+                if shape is None:
+                    shape, dtype = frames.shape[1:], frames.dtype
+                    # deltas of floats would not be decoded exactly
+                    delta = delta and dtype.kind in "iu"
+                if frames.shape[1:] != shape or frames.dtype != dtype:
+                    raise ValueError(
+                        f"All depth frames must have the same shape and type, "
+                        f"got {frames.shape[1:]} {frames.dtype}, "
+                        f"expected {shape} {dtype}"
+                    )
+                if delta:
+                    frames = _delta_encode(frames)
+                data = _compress(frames.tobytes(), codec)
+                chunks.append((f.tell(), len(data)))
+                f.write(data)
+                ids.extend(frame.id for frame in chunk_meta)
+
+            index = {
+                "codec": codec,
+                "delta": delta,
+                "chunk_size": chunk_size,
+                "shape": list(shape or ()),
+                "dtype": dtype.str if dtype is not None else "<u2",
+                "ids": ids,
+                "chunks": chunks,
+            }
+            index_offset = f.tell()
+            f.write(json.dumps(index).encode())
+            f.seek(0)
+            f.write(_HEADER.pack(MAGIC, index_offset))
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f"Packed {len(ids)} depth frames into `{out_path}`")
+    return out_path
+
+
+class DepthContainer:
+    def __init__(self, path: Union[str, Path]) -> None:
+        self._path = Path(path)
+        err = f"Invalid depth container file `{self._path}`"
+        try:
+            with self._path.open("rb") as f:
+                magic, index_offset = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != MAGIC:
+                    raise ValueError(f"{err}: unexpected header {magic!r}")
+                f.seek(index_offset)
+                index = json.loads(f.read().decode())
+        except (OSError, struct.error, json.JSONDecodeError) as e:
+            raise ValueError(f"{err}: {e}") from e
+
+        self._codec: str = index["codec"]
+        self._delta: bool = index["delta"]
+        self._chunk_size: int = index["chunk_size"]
+        self._shape: Tuple[int, ...] = tuple(index["shape"])
+        self._dtype = np.dtype(index["dtype"])
+        self._chunks: List[Tuple[int, int]] = [tuple(c) for c in index["chunks"]]
+        self._positions: Dict[int, int] = {
+            id: position for position, id in enumerate(index["ids"])
+        }
+        self._cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        state["_cache"] = OrderedDict()
+        return state
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, id: object) -> bool:
+        return id in self._positions
+
+    @property
+    def ids(self) -> Sequence[int]:
+        return list(self._positions)
+
+    def read_chunk(self, chunk: int) -> np.ndarray:
+        """
+        Returns the frames (n, h, w[, c]) of the chunk, reading it in one I/O.
+        """
+        if chunk in self._cache:
+            self._cache.move_to_end(chunk)
+            return self._cache[chunk]
+
+        offset, nbytes = self._chunks[chunk]
+        with self._path.open("rb") as f:
+            f.seek(offset)
+            data = f.read(nbytes)
+        frames = np.frombuffer(_decompress(data, self._codec), dtype=self._dtype)
+        frames = frames.reshape((-1,) + self._shape)
+        if self._delta:
+            frames = _delta_decode(frames)
+
+        self._cache[chunk] = frames
+        if len(self._cache) > CHUNK_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return frames
+
+    def read_image(self, id: int) -> np.ndarray:
+        try:
+            position = self._positions[id]
+        except KeyError:
+            raise ValueError(f"Depth frame {id} not found in `{self._path}`")
+        chunk, position_in_chunk = divmod(position, self._chunk_size)
+        return self.read_chunk(chunk)[position_in_chunk]
+
+    def read_frame(self, frame: DepthFrameMeta) -> np.ndarray:
+        """
+        Returns the frame in the same representation as `load_depth_frame`.
+        """
+        return depth_pixels(self.read_image(frame.id))
+
+
+def open_depth_container(meta_file: Path) -> DepthContainer:
+    """
+    Opens the container packed by `convert_depth_frames(meta_file)`.
+    """
+    return DepthContainer(meta_file.parent / DEPTH_CONTAINER_FILE_NAME)
+
+
+def _parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Pack depth frames of datasets into single-file containers"
+    )
+    parser.add_argument("roots", type=Path, nargs="+", help="dataset directories")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--codec", choices=available_codecs(), default=None)
+    parser.add_argument("--no-delta", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    for root in args.roots:
+        convert_depth_frames(
+            root / DEPTH_META_REL_PATH,
+            chunk_size=args.chunk_size,
+            codec=args.codec,
+            delta=not args.no_delta,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Node-local on-disk cache of decoded frames shared by processes and jobs.
+
+Each frame is stored as a `.npy` file named by the hash of its key (recording,
+modality, frame id and decode options). Files are written to a temporary file
+and atomically renamed, so concurrent readers never see partial frames and
+concurrent writers of the same frame are harmless. Hits are memory-mapped
+(read-only), the access time of a hit is recorded in the file modification
+time, and the least recently used files are removed when the total size of the
+cache exceeds `max_bytes`. The size is checked when a cache is opened and after
+all processes together wrote `max_bytes / EVICTION_FRACTION` (counted in a file of
+the cache, so many small jobs and DataLoader workers still enforce the cap).
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+try:
+    import fcntl
+except ImportError:  # Windows, bytes written are counted per process
+    fcntl = None  # type: ignore
+
+MAX_BYTES = 10 * 2 ** 30
+EVICTION_FRACTION = 16  # evict after writing 1/16 of the cap since the last eviction
+CACHE_VERSION = 1  # bump when representation of frames changes
+TMP_PREFIX = ".tmp-"
+WRITTEN_FILE_NAME = ".written"  # bytes written by all processes since the eviction
+
+
+def make_key(recording: Union[str, Path], modality: str, id: int, options: Any) -> str:
+    """
+    Returns the key of a frame. `recording` must be an absolute path without
+    symlinks (resolve it once per recording), `options` are the decode options as
+    far as they change the decoded frame (`repr` is used).
+    """
+    raw = f"{CACHE_VERSION}|{recording}|{modality}|{id}|{options!r}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class FrameCache:
+    def __init__(self, root: Union[str, Path], max_bytes: int = MAX_BYTES) -> None:
+        if max_bytes <= 0:
+            raise ValueError(f"Max cache size must be positive, got: {max_bytes}")
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._written = 0  # bytes written by the process (without `fcntl`)
+        self.evict()  # e.g. the cap is lower than in previous jobs
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    def _path(self, key: str) -> Path:
+        return self._root / key[:2] / f"{key}.npy"
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._path(key).exists()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        path = self._path(key)
+        try:
+            frame = np.load(path, mmap_mode="r")
+            os.utime(path)  # recently used
+        except (OSError, ValueError):  # missing (e.g. evicted) or foreign file
+            return None
+        return frame
+
+    def put(self, key: str, frame: np.ndarray) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=TMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, frame)
+                # `path` may already be evicted by another process once replaced
+                nbytes = f.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if self._add_written(nbytes):
+            self.evict()
+
+    def get_or_load(
+        self, key: str, load: Callable[[], Optional[np.ndarray]]
+    ) -> Optional[np.ndarray]:
+        frame = self.get(key)
+        if frame is None:
+            frame = load()
+            if frame is not None:
+                self.put(key, frame)
+        return frame
+
+    def _add_written(self, nbytes: int) -> bool:
+        """
+        Adds to the bytes written by all processes since the last eviction,
+        returns whether to evict now (the count is reset).
+        """
+        threshold = self._max_bytes // EVICTION_FRACTION
+        if fcntl is None:
+            self._written += nbytes
+            evict = self._written >= threshold
+            self._written = 0 if evict else self._written
+            return evict
+        fd = os.open(self._root / WRITTEN_FILE_NAME, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when closed
+            data = f.read().strip()
+            written = (int(data) if data.isdigit() else 0) + nbytes
+            evict = written >= threshold
+            f.seek(0)
+            f.truncate()
+            f.write(b"0" if evict else str(written).encode())
+        return evict
+
+    def _files(self) -> List[Tuple[float, int, Path]]:
+        files = []
+        for entry in os.scandir(self._root):
+            if not entry.is_dir():
+                continue
+            for file in os.scandir(entry.path):
+                if file.name.startswith(TMP_PREFIX):  # being written
+                    continue
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:  # removed by another process
+                    continue
+                files.append((stat.st_mtime, stat.st_size, Path(file.path)))
+        return files
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used frames until the cache fits `max_bytes`.
+        """
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self._max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:  # removed by another process
+                pass
+            total -= size
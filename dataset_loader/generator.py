@@ -0,0 +1,304 @@
+"""
+Generator of synthetic recordings in the layout expected by `MyDataset`:
+
+    <root>/
+      rgb/video.mp4
+      rgb/per_frame_timestamps.txt
+      depth/frame-XXXXXX.png
+      depth/per_frame_timestamps.txt
+      touch/observation-XXXXXX.txt
+      touch/per_observation_timestamps.txt
+
+Frame contents are deterministic functions of the frame id, so that loaded data
+can be checked against the generator. Video encoding runs in one worker process
+while depth frames and observations are written by the other workers in chunks.
+"""
+import argparse
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from dataset_loader.recording import (
+    DEPTH_META_REL_PATH,
+    OBSERVATION_META_REL_PATH,
+    RGB_META_REL_PATH,
+    VIDEO_FILE_NAME,
+    DepthFrameMeta,
+    ObservationMeta,
+    create_video_writer,
+    ms_to_frame_index,
+)
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256  # files written by a single worker task
+PNG_COMPRESSION = 1  # fast rather than small
+
+
+@dataclass(frozen=True)
+class StreamSpec:
+    count: int  # number of frames before removing gaps
+    rate: float  # Hz
+    start_ms: int = 0
+    jitter_ms: int = 0  # max absolute deviation from the regular timestamp
+    gap_prob: float = 0.0  # probability for each frame to be missing
+
+    def __post_init__(self) -> None:
+        if self.count < 0:
+            raise ValueError(f"Frame count must be non-negative, got: {self.count}")
+        if self.rate <= 0:
+            raise ValueError(f"Rate must be positive, got: {self.rate}")
+        if self.start_ms < 0:
+            raise ValueError(f"Start ms must be non-negative, got: {self.start_ms}")
+        if not 0 <= self.jitter_ms < self.period_ms / 2:
+            raise ValueError(
+                f"Jitter must be in [0, {self.period_ms / 2}) ms "
+                f"to keep timestamps ordered, got: {self.jitter_ms}"
+            )
+        if not 0 <= self.gap_prob < 1:
+            raise ValueError(f"Gap probability must be in [0, 1), got: {self.gap_prob}")
+
+    @property
+    def period_ms(self) -> float:
+        return 1_000 / self.rate
+
+
+@dataclass(frozen=True)
+class GeneratorConfig:
+    rgb: StreamSpec = field(default_factory=lambda: StreamSpec(count=300, rate=30))
+    depth: StreamSpec = field(default_factory=lambda: StreamSpec(count=150, rate=15))
+    touch: StreamSpec = field(default_factory=lambda: StreamSpec(count=100, rate=10))
+    frame_size: Tuple[int, int] = (256, 224)  # (w, h) as in `Video.get_frame_size`
+    observation_size: int = 5
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        # the video has a frame per rgb period, even the closest jittered
+        # timestamps of consecutive frames must be seeked to distinct frames
+        rgb = self.rgb
+        ms = regular_timestamps(rgb)
+        latest = [ms_to_frame_index(m + rgb.jitter_ms, rgb.rate) for m in ms[:-1]]
+        earliest = [
+            ms_to_frame_index(max(m - rgb.jitter_ms, 0), rgb.rate) for m in ms[1:]
+        ]
+        if any(a >= b for a, b in zip(latest, earliest)):
+            raise ValueError(
+                f"Rgb jitter of {rgb.jitter_ms} ms can map timestamps to the same "
+                f"video frame at {rgb.rate} fps, reduce the jitter"
+            )
+
+
+def regular_timestamps(spec: StreamSpec) -> List[int]:
+    """
+    Returns timestamps (ms) of all frames of the stream without jitter.
+    """
+    ids = np.arange(spec.count)
+    return (spec.start_ms + np.round(ids * spec.period_ms)).astype(np.int64).tolist()
+
+
+def make_timestamps(
+    spec: StreamSpec, rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns timestamps (ms) and ids of the frames remaining after removing gaps.
+    """
+    ids = np.arange(spec.count)
+    ms = np.array(regular_timestamps(spec), dtype=np.int64)
+    if spec.jitter_ms:
+        ms += rng.integers(-spec.jitter_ms, spec.jitter_ms + 1, size=spec.count)
+        ms = np.maximum(ms, 0)
+    kept = rng.random(spec.count) >= spec.gap_prob
+    return ms[kept], ids[kept]
+
+
+def make_rgb_frame(id: int, frame_size: Tuple[int, int]) -> np.ndarray:
+    w, h = frame_size
+    base = np.arange(w)[None, :] + np.arange(h)[:, None]
+    channels = [(base + id * k) % 256 for k in (1, 2, 3)]
+    return np.stack(channels, axis=-1).astype(np.uint8)
+
+
+def make_depth_frame(id: int, frame_size: Tuple[int, int]) -> np.ndarray:
+    w, h = frame_size
+    base = np.arange(w)[None, :] * h + np.arange(h)[:, None]
+    return ((base + id * 101) % 65_536).astype(np.uint16)
+
+
+def make_observation(id: int, size: int) -> List[int]:
+    return [id * size + i for i in range(size)]
+
+
+def _write_meta(path: Path, title: str, ms: np.ndarray, ids: np.ndarray) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [f";{title}", ";MILLISECOND ID"]
+    lines += [f"{m:09} {i:06}" for m, i in zip(ms.tolist(), ids.tolist())]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def video_frame_ids(ms: np.ndarray, ids: np.ndarray, fps: float) -> List[int]:
+    """
+    Returns ids of the rgb frames of the video, one per video frame, such that the
+    frame seeked by `ms` is the frame `id` (video frames between timestamps
+    repeat the previous frame, and frames before the first timestamp the first).
+    """
+    indices = [ms_to_frame_index(m, fps) for m in ms.tolist()]
+    if any(a >= b for a, b in zip(indices, indices[1:])):
+        raise ValueError(
+            "Rgb timestamps must map to distinct video frames, "
+            "reduce the jitter of the rgb stream"
+        )
+    frame_ids: List[int] = []
+    for index, id in zip(indices, ids.tolist()):
+        previous = frame_ids[-1] if frame_ids else id
+        frame_ids.extend([previous] * (index - len(frame_ids)))
+        frame_ids.append(id)
+    return frame_ids
+
+
+def _write_video(
+    path: Path, frame_ids: Sequence[int], fps: float, frame_size: Tuple[int, int]
+) -> None:
+    writer = create_video_writer(path, fps, frame_size)
+    try:
+        for id in frame_ids:
+            writer.write(make_rgb_frame(id, frame_size))
+    finally:
+        writer.release()
+
+
+def _write_depth_frames(
+    base_dir: Path, ids: Sequence[int], frame_size: Tuple[int, int]
+) -> None:
+    params = [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+    for id in ids:
+        path = DepthFrameMeta(id=id, ms=0, base_dir=base_dir).file_path
+        if not cv2.imwrite(str(path), make_depth_frame(id, frame_size), params):
+            raise ValueError(f"Could not write depth frame file `{path}`")
+
+
+def _write_observations(base_dir: Path, ids: Sequence[int], size: int) -> None:
+    for id in ids:
+        path = ObservationMeta(id=id, ms=0, base_dir=base_dir).file_path
+        path.write_text(" ".join(map(str, make_observation(id, size))) + "\n")
+
+
+def _chunks(ids: np.ndarray, size: int = CHUNK_SIZE) -> List[List[int]]:
+    return [chunk.tolist() for chunk in np.split(ids, range(size, len(ids), size))]
+
+
+def generate_dataset(
+    root: Union[str, Path],
+    config: Optional[GeneratorConfig] = None,
+    *,
+    workers: Optional[int] = None,
+) -> None:
+    """
+    Writes a synthetic recording into `root`. `workers` is the number of
+    processes (by default, number of CPUs).
+    """
+    root = Path(root)
+    config = config or GeneratorConfig()
+    rng = np.random.default_rng(config.seed)
+    rgb_ms, rgb_ids = make_timestamps(config.rgb, rng)
+    depth_ms, depth_ids = make_timestamps(config.depth, rng)
+    touch_ms, touch_ids = make_timestamps(config.touch, rng)
+    frame_ids = video_frame_ids(rgb_ms, rgb_ids, config.rgb.rate)
+
+    rgb_meta = root / RGB_META_REL_PATH
+    depth_meta = root / DEPTH_META_REL_PATH
+    touch_meta = root / OBSERVATION_META_REL_PATH
+    _write_meta(rgb_meta, "synthetic rgb frames", rgb_ms, rgb_ids)
+    _write_meta(depth_meta, "synthetic depth frames", depth_ms, depth_ids)
+    _write_meta(touch_meta, "synthetic observations", touch_ms, touch_ids)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # the video is submitted first as it is the longest sequential task
+        futures: List[Future[None]] = [
+            executor.submit(
+                _write_video,
+                rgb_meta.parent / VIDEO_FILE_NAME,
+                frame_ids,
+                config.rgb.rate,
+                config.frame_size,
+            )
+        ]
+        for ids in _chunks(depth_ids):
+            futures.append(
+                executor.submit(
+                    _write_depth_frames, depth_meta.parent, ids, config.frame_size
+                )
+            )
+        for ids in _chunks(touch_ids):
+            futures.append(
+                executor.submit(
+                    _write_observations, touch_meta.parent, ids, config.observation_size
+                )
+            )
+        for future in futures:
+            future.result()
+
+    logger.info(
+        f"Generated dataset `{root}`: {len(rgb_ids)} rgb frames, "
+        f"{len(depth_ids)} depth frames, {len(touch_ids)} observations"
+    )
+
+
+def _parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("root", type=Path, help="output dataset directory")
+    defaults = GeneratorConfig()
+    for name in ("rgb", "depth", "touch"):
+        spec: StreamSpec = getattr(defaults, name)
+        parser.add_argument(f"--{name}-count", type=int, default=spec.count)
+        parser.add_argument(f"--{name}-rate", type=float, default=spec.rate)
+        parser.add_argument(f"--{name}-start-ms", type=int, default=spec.start_ms)
+        parser.add_argument(f"--{name}-jitter-ms", type=int, default=spec.jitter_ms)
+        parser.add_argument(f"--{name}-gap-prob", type=float, default=spec.gap_prob)
+    parser.add_argument("--width", type=int, default=defaults.frame_size[0])
+    parser.add_argument("--height", type=int, default=defaults.frame_size[1])
+    parser.add_argument(
+        "--observation-size", type=int, default=defaults.observation_size
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    try:
+        args.config = _make_config(args)
+    except ValueError as e:  # invalid streams fail before generating anything
+        parser.error(str(e))
+    return args
+
+
+def _make_config(args: argparse.Namespace) -> GeneratorConfig:
+    streams = {
+        name: StreamSpec(
+            count=getattr(args, f"{name}_count"),
+            rate=getattr(args, f"{name}_rate"),
+            start_ms=getattr(args, f"{name}_start_ms"),
+            jitter_ms=getattr(args, f"{name}_jitter_ms"),
+            gap_prob=getattr(args, f"{name}_gap_prob"),
+        )
+        for name in ("rgb", "depth", "touch")
+    }
+    return GeneratorConfig(
+        frame_size=(args.width, args.height),
+        observation_size=args.observation_size,
+        seed=args.seed,
+        **streams,
+    )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    generate_dataset(args.root, args.config, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Parallel decoding of a single video by keyframe-aligned segments.
+
+Requested frames are grouped into segments starting at keyframes, each segment
+is decoded sequentially by a worker process and the frames are yielded back in
+the requested order. Keyframes are read from packet headers with PyAV when it
+is installed, otherwise segments of `SEGMENT_FRAMES` frames are used (the decoder
+then seeks to the preceding keyframe of each segment by itself).
+"""
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import (
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from dataset_loader.recording import (
+    DEFAULT_DECODE_OPTIONS,
+    DecodeOptions,
+    PyAVVideo,
+    Video,
+    ms_to_frame_index,
+    open_video,
+)
+
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_FRAMES = 250  # min number of frames decoded by a single worker task
+SEGMENTS_IN_FLIGHT_PER_WORKER = 2
+
+
+class Segment(NamedTuple):
+    start: int  # index of the frame to start decoding from
+    indices: Sequence[int]  # sorted indices of the requested frames
+
+
+def plan_segments(
+    indices: Sequence[int],
+    keyframes: Optional[Sequence[int]] = None,
+    segment_frames: int = SEGMENT_FRAMES,
+) -> List[Segment]:
+    """
+    Splits sorted unique frame `indices` into segments starting at keyframes
+    (or at multiples of `segment_frames` if keyframes are unknown) and spanning
+    at least `segment_frames` frames.
+    """
+    if not len(indices):
+        return []
+    if keyframes:
+        starts = np.asarray(sorted(keyframes))
+    else:
+        starts = np.arange(0, indices[-1] + 1, segment_frames)
+    # merge short groups of pictures, so that a task is not dominated by seeking
+    merged = [0]
+    for start in starts:
+        if start - merged[-1] >= segment_frames:
+            merged.append(int(start))
+    bounds = np.asarray(merged)
+
+    array = np.asarray(indices)
+    segment_ids = np.searchsorted(bounds, array, side="right") - 1
+    splits = np.flatnonzero(np.diff(segment_ids)) + 1
+    groups = zip(np.split(array, splits), np.split(segment_ids, splits))
+    return [
+        Segment(start=int(bounds[group_ids[0]]), indices=group.tolist())
+        for group, group_ids in groups
+    ]
+
+
+def _read_frames(
+    video: Union[Video, PyAVVideo], start: int, indices: Sequence[int]
+) -> Dict[int, np.ndarray]:
+    frames = {}
+    wanted = set(indices)
+    last = max(indices)
+    for index, frame in video.iter_frames(start):
+        if index in wanted:
+            frames[index] = frame
+        if index >= last:
+            break
+    return frames
+
+
+def _decode_segment(
+    video_path: Path, options: DecodeOptions, segment: Segment
+) -> Dict[int, np.ndarray]:
+    with open_video(video_path, options) as video:
+        return _read_frames(video, segment.start, segment.indices)
+
+
+def decode_sequential(
+    video_path: Union[str, Path],
+    ms: Sequence[int],
+    options: DecodeOptions = DEFAULT_DECODE_OPTIONS,
+) -> List[Optional[np.ndarray]]:
+    """
+    Returns frames for timestamps `ms` as `Video.seek_read_frame` would, seeking
+    once to the earliest frame and decoding the following frames sequentially
+    (each frame is decoded once, even if requested several times).
+    """
+    if not len(ms):
+        return []
+    with open_video(Path(video_path), options) as video:
+        fps = video.get_fps()
+        indices = [ms_to_frame_index(m, fps) for m in ms]
+        frames = _read_frames(video, min(indices), indices)
+    return [frames.get(index) for index in indices]
+
+
+class ParallelVideoDecoder:
+    def __init__(
+        self,
+        video_path: Union[str, Path],
+        *,
+        workers: Optional[int] = None,
+        options: DecodeOptions = DEFAULT_DECODE_OPTIONS,
+        segment_frames: int = SEGMENT_FRAMES,
+    ) -> None:
+        self._video_path = Path(video_path)
+        self._workers = workers
+        self._options = options
+        self._segment_frames = segment_frames
+        with open_video(self._video_path, options) as video:
+            self._fps = video.get_fps()
+        self._keyframes = self._read_keyframes()
+
+    def _read_keyframes(self) -> Optional[List[int]]:
+        try:
+            with PyAVVideo(self._video_path) as video:
+                return video.get_keyframe_indices()
+        except ValueError as e:
+            logger.debug(f"Using segments of {self._segment_frames} frames: {e}")
+            return None
+
+    def decode(self, ms: Sequence[int]) -> Iterator[Optional[np.ndarray]]:
+        """
+        Yields frames for non-decreasing timestamps `ms` as `Video.seek_read_frame`
+        would (None for the frames beyond the end of the video).
+        """
+        indices = [ms_to_frame_index(m, self._fps) for m in ms]
+        if any(a > b for a, b in zip(indices, indices[1:])):
+            raise ValueError("Timestamps of frames to decode must be non-decreasing")
+        unique = sorted(set(indices))
+        segments = plan_segments(unique, self._keyframes, self._segment_frames)
+
+        workers = self._workers or os.cpu_count() or 1
+        in_flight = SEGMENTS_IN_FLIGHT_PER_WORKER * workers
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            queued = iter(segments)
+            pending: Deque[Tuple[Segment, Future[Dict[int, np.ndarray]]]] = deque()
+            segment: Optional[Segment] = None
+            frames: Dict[int, np.ndarray] = {}
+            for index in indices:
+                while segment is None or index > segment.indices[-1]:
+                    for queued_segment in islice(queued, in_flight - len(pending)):
+                        future = executor.submit(
+                            _decode_segment,
+                            self._video_path,
+                            self._options,
+                            queued_segment,
+                        )
+                        pending.append((queued_segment, future))
+                    segment, future = pending.popleft()
+                    frames = future.result()
+                yield frames.get(index)
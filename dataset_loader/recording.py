@@ -0,0 +1,1276 @@
+"""
+Meta files, frames and alignment of a recording, without torch.
+
+`Recording` iterates over the aligned samples of a recording and is the base of
+`dataset_loader.dataset_loader.MyDataset` (a torch `IterableDataset`). Tools
+which do not feed a `DataLoader` (e.g. touch-only tools, validation) use this
+module directly and start without importing torch.
+"""
+import bisect
+import io
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from itertools import accumulate, tee
+from pathlib import Path
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
+
+from dataset_loader.bulk_reader import BulkFileReader
+from dataset_loader.frame_cache import FrameCache, make_key
+from dataset_loader.sampler import BlockShuffleSampler
+from dataset_loader.shared_memory import (
+    ALIGNMENT,
+    SLOTS_PER_WORKER,
+    SharedFrameRing,
+)
+from dataset_loader.utils import (
+    align_closest,
+    linearize_timeline,
+    round_robin_offsets,
+)
+
+
+if TYPE_CHECKING:
+    import cv2
+
+    from torch.utils.data._utils.worker import WorkerInfo
+
+    from dataset_loader.depth_container import DepthContainer
+    from dataset_loader.parallel_decode import ParallelVideoDecoder
+
+
+logger = logging.getLogger(__name__)
+
+VIDEO_FILE_NAME = "video.mp4"
+DEPTH_META_REL_PATH = Path("depth/per_frame_timestamps.txt")
+RGB_META_REL_PATH = Path("rgb/per_frame_timestamps.txt")
+OBSERVATION_META_REL_PATH = Path("touch/per_observation_timestamps.txt")
+STREAM_META_FILE_NAME = "per_frame_timestamps.txt"  # in extra stream directories
+MODALITIES = ("touch", "rgb", "depth")
+PRUNING = ("drop", "mark")
+PRUNED_MS = -1  # timestamp of a frame too far from the touch timestamp
+
+RGB_FRAME_CACHE_SIZE = 5
+DEPTH_FRAME_CACHE_SIZE = 5
+OBSERVATION_FRAME_CACHE_SIZE = 5
+
+M = TypeVar("M")
+
+
+@dataclass(frozen=True)
+class RgbFrameMeta:
+    id: int
+    ms: int
+    video_path: Path
+
+
+@dataclass(frozen=True)
+class DepthFrameMeta:
+    id: int
+    ms: int
+    base_dir: Path
+
+    @property
+    def _file_name(self) -> str:
+        return f"frame-{self.id:06}.png"
+
+    @property
+    def file_path(self) -> Path:
+        return self.base_dir / self._file_name
+
+
+@dataclass(frozen=True)
+class ObservationMeta:
+    id: int
+    ms: int
+    base_dir: Path
+
+    @property
+    def _file_name(self) -> str:
+        return f"observation-{self.id:06}.txt"
+
+    @property
+    def file_path(self) -> Path:
+        return self.base_dir / self._file_name
+
+
+@dataclass(frozen=True)
+class StreamFrameMeta:
+    # frame of an extra stream (IMU, audio, other cameras, ...), whose data is
+    # loaded by the user
+    id: int
+    ms: int
+    base_dir: Path
+
+
+@dataclass(frozen=True)
+class DecodeOptions:
+    backend: str = "any"  # one of `DECODE_BACKENDS`
+    threads: int = 0  # number of decoder threads, 0 lets the decoder choose
+
+    def __post_init__(self) -> None:
+        if self.backend not in DECODE_BACKENDS:
+            raise ValueError(
+                f"Decode backend must be one of {DECODE_BACKENDS}, "
+                f"got: {self.backend}"
+            )
+        if self.threads < 0:
+            raise ValueError(
+                f"Number of decoder threads must be non-negative, got: {self.threads}"
+            )
+
+
+DECODE_BACKENDS = ("any", "ffmpeg", "pyav")
+DEFAULT_DECODE_OPTIONS = DecodeOptions()
+
+
+def ms_to_frame_index(ms: float, fps: float) -> int:
+    # the same rounding as OpenCV's FFmpeg backend uses for `CAP_PROP_POS_MSEC`
+    return int(ms * 0.001 * fps + 0.5)
+
+
+class Video:
+    def __init__(
+        self, path: Union[str, Path], options: DecodeOptions = DEFAULT_DECODE_OPTIONS
+    ) -> None:
+        if options.backend not in ("any", "ffmpeg"):
+            raise ValueError(f"Unsupported OpenCV decode backend: {options.backend}")
+        self._path = Path(path)
+        self._options = options
+        self._cap: Optional["cv2.VideoCapture"] = None
+
+    def __enter__(self) -> "Video":
+        import cv2  # imported with the first video, as only rgb frames need it
+
+        assert not self._cap
+        api = cv2.CAP_FFMPEG if self._options.backend == "ffmpeg" else cv2.CAP_ANY
+        if self._options.threads and hasattr(cv2, "CAP_PROP_N_THREADS"):
+            params = [cv2.CAP_PROP_N_THREADS, self._options.threads]
+            self._cap = cv2.VideoCapture(str(self._path), api, params)
+        else:
+            if self._options.threads:
+                logger.warning("OpenCV does not support setting decoder threads")
+            self._cap = cv2.VideoCapture(str(self._path), api)
+        if not self._cap.isOpened():
+            raise ValueError(f"Could open video file {self._path}")
+        return self
+
+    def __exit__(self, type: Any, value: Any, tb: Any) -> None:
+        assert self._cap and self._cap.isOpened()
+        self._cap.release()
+        self._cap = None
+
+    def get_fps(self) -> int:
+        import cv2
+
+        assert self._cap and self._cap.isOpened()
+        return self._cap.get(cv2.CAP_PROP_FPS)
+
+    def get_frame_size(self) -> Tuple[int, int]:
+        import cv2
+
+        assert self._cap and self._cap.isOpened()
+        w = self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+        h = self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        return int(w), int(h)
+
+    def get_frame_count(self) -> int:
+        """
+        Returns the number of frames from the container headers (no decoding).
+        """
+        import cv2
+
+        assert self._cap and self._cap.isOpened()
+        return int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def seek_read_frame(self, ms: int) -> Optional[np.ndarray]:
+        import cv2
+
+        assert self._cap and self._cap.isOpened()
+        self._cap.set(cv2.CAP_PROP_POS_MSEC, ms)
+        ret, frame = self._cap.read()
+        if not ret:  # EOF
+            return None
+        return frame
+
+    def iter_frames(self, start: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yields frames with their indices sequentially starting from frame `start`.
+        """
+        import cv2
+
+        assert self._cap and self._cap.isOpened()
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while True:
+            ret, frame = self._cap.read()
+            if not ret:  # EOF
+                return
+            yield index, frame
+            index += 1
+
+    def create_video_writer(
+        self, out_path: Union[str, Path], fmt: str = "mp4v"
+    ) -> "cv2.VideoWriter":
+        assert self._cap and self._cap.isOpened()
+        return create_video_writer(
+            out_path, self.get_fps(), self.get_frame_size(), fmt=fmt
+        )
+
+
+class PyAVVideo:
+    """
+    Same interface as `Video` (except for writing) decoding with PyAV,
+    which allows frame-threaded decoding.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], options: DecodeOptions = DEFAULT_DECODE_OPTIONS
+    ) -> None:
+        self._path = Path(path)
+        self._options = options
+        self._container: Any = None
+        self._stream: Any = None
+
+    def __enter__(self) -> "PyAVVideo":
+        assert not self._container
+        try:
+            import av
+        except ImportError as e:
+            raise ValueError(f"Decode backend 'pyav' requires PyAV: {e}") from e
+        try:
+            self._container = av.open(str(self._path))
+        except (av.FFmpegError, OSError) as e:
+            raise ValueError(f"Could open video file {self._path}: {e}") from e
+        self._stream = self._container.streams.video[0]
+        self._stream.thread_type = "AUTO"  # frame and slice threading
+        self._stream.thread_count = self._options.threads
+        return self
+
+    def __exit__(self, type: Any, value: Any, tb: Any) -> None:
+        assert self._container
+        self._container.close()
+        self._container = None
+        self._stream = None
+
+    def get_fps(self) -> float:
+        assert self._stream
+        return float(self._stream.average_rate)
+
+    def get_frame_size(self) -> Tuple[int, int]:
+        assert self._stream
+        return self._stream.codec_context.width, self._stream.codec_context.height
+
+    def get_frame_count(self) -> int:
+        assert self._stream
+        return int(self._stream.frames)
+
+    def _frame_index(self, frame: Any) -> int:  # frame or packet
+        start = self._stream.start_time or 0
+        return round((frame.pts - start) * self._stream.time_base * self.get_fps())
+
+    def _pts(self, index: int) -> int:
+        start = self._stream.start_time or 0
+        return start + int(index / self.get_fps() / self._stream.time_base)
+
+    def seek_read_frame(self, ms: int) -> Optional[np.ndarray]:
+        assert self._stream
+        index = ms_to_frame_index(ms, self.get_fps())
+        return next((frame for _, frame in self.iter_frames(index)), None)
+
+    def iter_frames(self, start: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+        assert self._stream
+        # seeks to the closest keyframe before the frame
+        self._container.seek(self._pts(start), stream=self._stream)
+        for frame in self._container.decode(self._stream):
+            index = self._frame_index(frame)
+            if index >= start:
+                yield index, frame.to_ndarray(format="bgr24")
+
+    def get_keyframe_indices(self) -> List[int]:
+        """
+        Returns indices of keyframes reading only packet headers (no decoding).
+        """
+        assert self._stream
+        self._container.seek(self._pts(0), stream=self._stream)
+        indices = [
+            self._frame_index(packet)
+            for packet in self._container.demux(self._stream)
+            if packet.is_keyframe and packet.pts is not None
+        ]
+        return sorted(indices)
+
+
+def open_video(
+    path: Union[str, Path], options: DecodeOptions = DEFAULT_DECODE_OPTIONS
+) -> Union[Video, PyAVVideo]:
+    if options.backend == "pyav":
+        return PyAVVideo(path, options)
+    return Video(path, options)
+
+
+def create_video_writer(
+    out_path: Union[str, Path],
+    fps: float,
+    frame_size: Tuple[int, int],
+    fmt: str = "mp4v",
+) -> "cv2.VideoWriter":
+    import cv2
+
+    fourcc = cv2.VideoWriter_fourcc(*fmt)
+    return cv2.VideoWriter(str(out_path), fourcc, fps, frame_size)
+
+
+def _strip_lines(lines: Iterable[str]) -> List[str]:
+    stripped = [line.split(";")[0].strip() for line in lines]
+    return [line for line in stripped if line]
+
+
+def _parse_ms_id_line(line: str, error_prefix: str) -> Tuple[int, int]:
+    e = error_prefix
+    spl = line.split()
+    if len(spl) != 2:
+        raise ValueError(f"{e}: expect 2 elements, got {len(spl)}: {spl}")
+    ms_str, frame_id_str = spl
+
+    try:
+        ms = int(ms_str)
+        if ms < 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"{e}: 1st element must be a positive int, got: {ms_str}")
+
+    try:
+        id = int(frame_id_str)
+        if id < 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError(
+            f"{e}: 2nd element must be a positive int, got: {frame_id_str}"
+        )
+
+    return ms, id
+
+
+class MetaFileTail(Generic[M]):
+    """
+    Parses a frames (or observations) meta file incrementally: each `read` parses
+    only the lines appended since the previous one.
+    """
+
+    def __init__(
+        self, meta_file: Path, kind: str, make_meta: Callable[..., M]
+    ) -> None:
+        self._meta_file = meta_file
+        self._error_prefix = f"Invalid {kind} meta file `{meta_file}`"
+        self._make_meta = make_meta  # called with keyword arguments `id` and `ms`
+        self._offset = 0  # bytes read so far
+        self._lines_read = 0  # non-empty lines parsed so far
+        self._last_ms: Optional[int] = None
+
+    @property
+    def offset(self) -> int:
+        return self._offset
+
+    def read(
+        self,
+        complete_lines_only: bool = False,
+        strict: bool = False,
+        missing_ok: bool = False,
+    ) -> Dict[int, M]:
+        """
+        With `complete_lines_only`, the last line is left for the next read
+        unless it ends with a line break (i.e. it may still be being written).
+        With `strict`, timestamps not increasing (e.g. duplicated lines, which
+        would otherwise be collapsed) are errors. With `missing_ok`, a file not
+        created yet is read as empty.
+        """
+        try:
+            with self._meta_file.open("rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            if not missing_ok:
+                raise
+            data = b""
+        if complete_lines_only:
+            end = data.rfind(b"\n") + 1
+            data = data[:end]
+        self._offset += len(data)
+
+        meta = {}
+        for line in _strip_lines(data.decode().splitlines()):
+            self._lines_read += 1
+            error_prefix = f"{self._error_prefix}: line {self._lines_read}"
+            ms, id = _parse_ms_id_line(line, error_prefix)
+            if strict and self._last_ms is not None and ms <= self._last_ms:
+                raise ValueError(
+                    f"{error_prefix}: timestamps must be increasing, "
+                    f"got {ms} after {self._last_ms}"
+                )
+            self._last_ms = ms
+            meta[ms] = self._make_meta(id=id, ms=ms)
+        return meta
+
+
+def _rgb_frames_meta_tail(meta_file: Path) -> MetaFileTail[RgbFrameMeta]:
+    video_path = meta_file.parent / VIDEO_FILE_NAME
+    make_meta = partial(RgbFrameMeta, video_path=video_path)
+    return MetaFileTail(meta_file, "rgb frames", make_meta)
+
+
+def _depth_frames_meta_tail(meta_file: Path) -> MetaFileTail[DepthFrameMeta]:
+    make_meta = partial(DepthFrameMeta, base_dir=meta_file.parent)
+    return MetaFileTail(meta_file, "depth frames", make_meta)
+
+
+def _observations_meta_tail(meta_file: Path) -> MetaFileTail[ObservationMeta]:
+    make_meta = partial(ObservationMeta, base_dir=meta_file.parent)
+    return MetaFileTail(meta_file, "observations", make_meta)
+
+
+def _stream_frames_meta_tail(
+    meta_file: Path, name: str
+) -> MetaFileTail[StreamFrameMeta]:
+    make_meta = partial(StreamFrameMeta, base_dir=meta_file.parent)
+    return MetaFileTail(meta_file, f"{name} frames", make_meta)
+
+
+def read_rgb_frames_meta(
+    meta_file: Path, *, strict: bool = False
+) -> Mapping[int, RgbFrameMeta]:
+    return _rgb_frames_meta_tail(meta_file).read(strict=strict)
+
+
+def read_depth_frames_meta(
+    meta_file: Path, *, strict: bool = False
+) -> Mapping[int, DepthFrameMeta]:
+    return _depth_frames_meta_tail(meta_file).read(strict=strict)
+
+
+def read_observations_meta(
+    meta_file: Path, *, strict: bool = False
+) -> Mapping[int, ObservationMeta]:
+    return _observations_meta_tail(meta_file).read(strict=strict)
+
+
+@lru_cache(maxsize=RGB_FRAME_CACHE_SIZE)
+def load_rgb_frame(
+    frame: RgbFrameMeta, options: DecodeOptions = DEFAULT_DECODE_OPTIONS
+) -> np.ndarray:
+    # NOTE: tested in 'TestFunctionLoadRgbFrame'
+    path = frame.video_path
+    err = f"Could not load rgb frame file `{path}`"
+    try:
+        with open_video(path, options) as video:
+            return video.seek_read_frame(frame.ms)
+    except (ValueError, OSError) as e:
+        raise ValueError(f"{err}: {e}") from e
+
+
+def depth_pixels(image: np.ndarray) -> np.ndarray:
+    """
+    Converts an image array of shape (h, w[, c]) to the representation of depth
+    frames in `DataItem`: an array of pixels (h * w[, c]), as `Image.getdata` gives.
+    """
+    h, w = image.shape[:2]
+    dtype = np.float64 if image.dtype.kind == "f" else np.int64
+    return image.reshape((h * w,) + image.shape[2:]).astype(dtype)
+
+
+@lru_cache(maxsize=DEPTH_FRAME_CACHE_SIZE)
+def load_depth_frame(frame: DepthFrameMeta) -> np.ndarray:
+    # NOTE: tested in 'TestFunctionLoadDepthFrame'
+    path = frame.file_path
+    try:
+        data = path.read_bytes()
+    except OSError as e:
+        raise ValueError(f"Could not load depth frame file `{path}`: {e}") from e
+    return decode_depth_frame(frame, data)
+
+
+def decode_depth_frame(frame: DepthFrameMeta, data: bytes) -> np.ndarray:
+    """
+    Decodes the depth frame from the contents of its file.
+    """
+    from PIL import Image
+
+    err = f"Could not load depth frame file `{frame.file_path}`"
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return depth_pixels(np.asarray(img))
+    except (ValueError, OSError) as e:
+        raise ValueError(f"{err}: {e}") from e
+
+
+@lru_cache(maxsize=OBSERVATION_FRAME_CACHE_SIZE)
+def load_observation(obs: Optional[ObservationMeta] = None) -> Sequence[int]:
+    # NOTE: tested in 'TestFunctionLoadObservation'
+    if obs is None:
+        return []
+
+    path = obs.file_path
+    try:
+        data = path.read_bytes()
+    except OSError as e:
+        raise ValueError(f"Could not load observation file `{path}`: {e}") from e
+    return parse_observation(obs, data)
+
+
+def parse_observation(obs: ObservationMeta, data: bytes) -> Sequence[int]:
+    """
+    Parses the observation from the contents of its file.
+    """
+    err = f"Could not load observation file `{obs.file_path}`"
+    try:
+        lines = _strip_lines(data.decode().splitlines())
+    except ValueError as e:
+        raise ValueError(f"{err}: {e}") from e
+    if not lines:
+        raise ValueError(f"{err}: no observations found in file")
+    if len(lines) > 1:
+        raise ValueError(f"{err}: must be exactly 1 line, found: {len(lines)}")
+    try:
+        return [int(num) for num in lines[0].split()]
+    except ValueError as e:
+        raise ValueError(f"{err}: {e}")
+
+
+def empty_frame() -> np.ndarray:
+    # frame of a modality which is not loaded
+    return np.empty(0, dtype=np.uint8)
+
+
+def _next_contents(
+    contents: Iterator[bytes], meta: Union[DepthFrameMeta, ObservationMeta]
+) -> bytes:
+    try:
+        return next(contents)
+    except OSError as e:
+        kind = "depth frame" if isinstance(meta, DepthFrameMeta) else "observation"
+        raise ValueError(f"Could not load {kind} file `{meta.file_path}`: {e}") from e
+
+
+class _AlignmentCursor(NamedTuple):
+    ms: int  # touch timestamp of the last aligned sample
+    main_pos: int  # index of the first touch timestamp after `ms`
+
+
+class DataItem(NamedTuple):
+    # Properties required in task
+    touch_timestamp_i: int  # ms
+    touch_i: Sequence[int]  # observation
+    rgb_j: np.ndarray  # rgb frame data
+    depth_k: np.ndarray  # depth frame data
+    # Additional properties for debugging
+    rgb_timestamp_j: int
+    depth_timestamp_k: int
+    # timestamps of the closest frames of extra streams by name,
+    # see `Recording.get_extra_frame`
+    extra_timestamps: Mapping[str, int] = MappingProxyType({})  # read-only
+
+
+class LazyDataItem:
+    """
+    Same properties as `DataItem`, but the observation and the frames are loaded
+    on first access.
+    """
+
+    def __init__(
+        self,
+        touch_timestamp_i: int,
+        rgb_timestamp_j: int,
+        depth_timestamp_k: int,
+        extra_timestamps: Mapping[str, int],
+        *,
+        load_touch: Callable[[], Sequence[int]],
+        load_rgb: Callable[[], np.ndarray],
+        load_depth: Callable[[], np.ndarray],
+    ) -> None:
+        self.touch_timestamp_i = touch_timestamp_i
+        self.rgb_timestamp_j = rgb_timestamp_j
+        self.depth_timestamp_k = depth_timestamp_k
+        self.extra_timestamps = extra_timestamps
+        self._loaders: Dict[str, Callable[[], Any]] = {
+            "touch_i": load_touch,
+            "rgb_j": load_rgb,
+            "depth_k": load_depth,
+        }
+        self._loaded: Dict[str, Any] = {}
+
+    def _get(self, name: str) -> Any:
+        if name not in self._loaded:
+            self._loaded[name] = self._loaders[name]()
+        return self._loaded[name]
+
+    @property
+    def touch_i(self) -> Sequence[int]:
+        return self._get("touch_i")
+
+    @property
+    def rgb_j(self) -> np.ndarray:
+        return self._get("rgb_j")
+
+    @property
+    def depth_k(self) -> np.ndarray:
+        return self._get("depth_k")
+
+    def to_item(self) -> DataItem:
+        return DataItem(
+            touch_timestamp_i=self.touch_timestamp_i,
+            touch_i=self.touch_i,
+            rgb_j=self.rgb_j,
+            depth_k=self.depth_k,
+            rgb_timestamp_j=self.rgb_timestamp_j,
+            depth_timestamp_k=self.depth_timestamp_k,
+            extra_timestamps=self.extra_timestamps,
+        )
+
+
+def _get_worker_info() -> Optional["WorkerInfo"]:
+    # there are no DataLoader workers unless torch is imported
+    if "torch" not in sys.modules:
+        return None
+    from torch.utils.data import get_worker_info
+
+    return get_worker_info()
+
+
+class Recording:
+    def __init__(
+        self,
+        root: Union[str, Path],
+        linearize: bool = False,
+        *,
+        decode_options: DecodeOptions = DEFAULT_DECODE_OPTIONS,
+        rgb_decode_workers: int = 0,
+        follow: bool = False,
+        depth_container: bool = False,
+        extra_streams: Sequence[str] = (),
+        sampler: Optional[BlockShuffleSampler] = None,
+        modalities: Collection[str] = MODALITIES,
+        lazy: bool = False,
+        frame_cache: Optional[FrameCache] = None,
+        bulk_reader: Optional[BulkFileReader] = None,
+        max_offset_ms: Optional[Mapping[str, int]] = None,
+        pruning: str = "drop",
+        step_ms: Optional[int] = None,
+    ):
+        """
+        With `follow`, the recording is considered as still being written: only
+        complete lines of the meta files are read, and only samples which cannot
+        change when more frames arrive are yielded (see `refresh` and `iter_follow`).
+        With `depth_container`, depth frames are read from the container packed
+        by `dataset_loader.depth_container.convert_depth_frames`.
+        `extra_streams` are names of directories next to `rgb/`, `depth/` and
+        `touch/` with `per_frame_timestamps.txt` meta files; timestamps of their
+        closest frames are returned in `DataItem.extra_timestamps`.
+        With `sampler`, samples are yielded in shuffled blocks of consecutive
+        samples, rgb frames of a block are decoded sequentially (see `set_epoch`).
+        Only `modalities` are loaded, the others are empty (`[]` observations and
+        empty arrays of frames). With `lazy`, `LazyDataItem`s are yielded.
+        With `frame_cache`, decoded rgb and depth frames are cached on disk and
+        shared with other processes (cached frames are read-only).
+        With `bulk_reader`, depth frame and observation files are read ahead in
+        batches (except for lazy items).
+        `max_offset_ms` maps "rgb", "depth" and names of extra streams to the max
+        distance from the touch timestamp to the closest frame. Samples exceeding
+        it are dropped (`pruning="drop"`) or have the frame marked as missing
+        (`pruning="mark"`: `PRUNED_MS` timestamp and an empty array).
+        `step_ms` is the step of the linearized timeline, by default the frame
+        interval of the video. The video is only opened for the rgb modality, so
+        `step_ms` is required to linearize without it.
+        """
+        super().__init__()
+        unknown = set(modalities) - set(MODALITIES)
+        if unknown:
+            raise ValueError(
+                f"Modalities must be in {MODALITIES}, got: {sorted(unknown)}"
+            )
+        root = Path(root)
+        self._root = root
+        self._frame_cache = frame_cache
+        self._cache_root = root.resolve()  # once, not for every cache key
+        self._bulk_reader = bulk_reader
+        self._modalities = frozenset(modalities)
+        self._lazy = lazy
+        self._follow = follow
+        self._video_path = (root / RGB_META_REL_PATH).parent / VIDEO_FILE_NAME
+        self._rgb_tail = _rgb_frames_meta_tail(root / RGB_META_REL_PATH)
+        self._depth_tail = _depth_frames_meta_tail(root / DEPTH_META_REL_PATH)
+        self._obs_tail = _observations_meta_tail(root / OBSERVATION_META_REL_PATH)
+        self._extra_streams = tuple(extra_streams)
+        self._extra_tails = [
+            _stream_frames_meta_tail(root / name / STREAM_META_FILE_NAME, name)
+            for name in self._extra_streams
+        ]
+        self._rgb_mapping: Dict[int, RgbFrameMeta] = {}
+        self._depth_mapping: Dict[int, DepthFrameMeta] = {}
+        self._obs_mapping: Dict[int, ObservationMeta] = {}
+        self._extra_mappings: List[Dict[int, StreamFrameMeta]] = [
+            {} for _ in self._extra_streams
+        ]
+        # timestamps in the order of meta files:
+        self._rgb_keys: List[int] = []
+        self._depth_keys: List[int] = []
+        self._obs_keys: List[int] = []
+        self._extra_keys: List[List[int]] = [[] for _ in self._extra_streams]
+
+        streams = ("rgb", "depth", *self._extra_streams)
+        max_offset_ms = max_offset_ms or {}
+        unknown = set(max_offset_ms) - set(streams)
+        if unknown:
+            raise ValueError(
+                f"Max offsets can be set for {streams}, got: {sorted(unknown)}"
+            )
+        if pruning not in PRUNING:
+            raise ValueError(f"Pruning must be one of {PRUNING}, got: {pruning}")
+        no_limit = np.iinfo(np.int64).max
+        self._max_offsets = np.array(
+            [max_offset_ms.get(name, no_limit) for name in streams], dtype=np.int64
+        )
+        self._pruning = pruning
+        self._read_meta(final=not follow)
+
+        self._linearize = linearize
+        self._decode_options = decode_options
+        # if positive, the video is decoded by segments in that many processes
+        self._rgb_decode_workers = rgb_decode_workers
+        self._sampler = sampler
+        self._epoch = 0
+        self._skip = 0  # items of the epoch to skip, see `load_state_dict`
+        self._skip_num_workers = 0  # number of workers the items were consumed from
+        self._step: Optional[int] = None  # step between frames in ms
+        if self._linearize:
+            if step_ms is not None:
+                if step_ms <= 0:
+                    raise ValueError(f"Step must be positive, got: {step_ms}")
+                self._step = step_ms
+            elif "rgb" in self._modalities:
+                with open_video(self._video_path, decode_options) as video:
+                    fps = video.get_fps()
+                self._step = int(1_000 / fps)
+            else:
+                raise ValueError(
+                    "Linearizing without the rgb modality requires `step_ms` "
+                    "(the video is not opened)"
+                )
+
+        self._frame_ring: Optional[SharedFrameRing] = None
+        # keyframes of the video are read once, not for every iteration
+        self._rgb_decoder: Optional["ParallelVideoDecoder"] = None
+        self._depth_container: Optional["DepthContainer"] = None
+        if depth_container and "depth" in self._modalities:
+            from dataset_loader.depth_container import open_depth_container
+
+            self._depth_container = open_depth_container(root / DEPTH_META_REL_PATH)
+        # aligned (touch ms, rgb ms, depth ms, *extra ms) samples, only appended to
+        self._aligned: List[Tuple[int, ...]] = []
+        self._timeline: List[int] = []  # touch ms of the aligned samples
+        self._cursor: Optional[_AlignmentCursor] = None
+        self._extend_alignment(final=not follow)
+
+    @property
+    def step(self) -> Optional[int]:
+        return self._step
+
+    def __len__(self) -> int:
+        """
+        Number of items the next iteration yields (in all DataLoader workers),
+        i.e. without those skipped after `load_state_dict`.
+        NOTE: grows with `refresh` in follow mode
+        """
+        return max(len(self._aligned) - self._skip, 0)
+
+    def set_epoch(self, epoch: int) -> None:
+        """
+        Sets the epoch for the sampler, must be called before each iteration
+        for the order of samples to change between epochs.
+        """
+        self._epoch = epoch
+        self._skip = 0
+        if self._sampler is not None:
+            self._sampler.set_epoch(epoch)
+
+    def state_dict(self, consumed: int, num_workers: int = 0) -> Dict[str, Any]:
+        """
+        Returns the state of the iteration of the current epoch after `consumed`
+        items were received from it (e.g. from a DataLoader with `batch_size=None`
+        and `num_workers` workers), to be restored with `load_state_dict`.
+        """
+        consumed += self._skip
+        if not 0 <= consumed <= len(self._aligned):
+            raise ValueError(
+                f"Number of consumed items must be in [0, {len(self._aligned)}], "
+                f"got: {consumed}"
+            )
+        state: Dict[str, Any] = {
+            "epoch": self._epoch,
+            "consumed": consumed,
+            "num_workers": num_workers,
+            # touch timestamp of the last consumed sample, from which the
+            # (linearized) timeline continues
+            "touch_ms": self._timeline[consumed - 1] if consumed else None,
+        }
+        if self._sampler is not None:
+            state["seed"] = self._sampler.seed
+            state["block_size"] = self._sampler.block_size
+        return state
+
+    def load_state_dict(self, state: Mapping[str, Any]) -> None:
+        """
+        Makes iterations of the epoch of `state` start after its consumed items,
+        until `set_epoch` is called. Without a sampler, the position is found by
+        the touch timestamp, with a sampler, the number of DataLoader workers must
+        be the same as when the state was saved.
+        """
+        if self._sampler is None:
+            if "seed" in state:
+                raise ValueError("The state was saved with a sampler")
+            touch_ms = state["touch_ms"]
+            skip = 0
+            if touch_ms is not None:
+                skip = bisect.bisect_right(self._timeline, touch_ms)
+        else:
+            expected = (self._sampler.seed, self._sampler.block_size)
+            if (state.get("seed"), state.get("block_size")) != expected:
+                raise ValueError(
+                    "The state was saved with another sampler, expected "
+                    f"seed and block size {expected}, got: "
+                    f"{(state.get('seed'), state.get('block_size'))}"
+                )
+            skip = state["consumed"]
+        self.set_epoch(state["epoch"])
+        self._skip = skip
+        self._skip_num_workers = state["num_workers"]
+
+    def _read_meta(self, final: bool) -> None:
+        streams: List[Tuple[MetaFileTail[Any], Dict[int, Any], List[int]]] = [
+            (self._rgb_tail, self._rgb_mapping, self._rgb_keys),
+            (self._depth_tail, self._depth_mapping, self._depth_keys),
+            (self._obs_tail, self._obs_mapping, self._obs_keys),
+            *zip(self._extra_tails, self._extra_mappings, self._extra_keys),
+        ]
+        for tail, mapping, keys in streams:
+            # while following, meta files may be created after the recording
+            new = tail.read(complete_lines_only=not final, missing_ok=not final)
+            keys.extend(ms for ms in new if ms not in mapping)
+            mapping.update(new)
+
+    def get_extra_frame(self, name: str, ms: int) -> StreamFrameMeta:
+        try:
+            mapping = self._extra_mappings[self._extra_streams.index(name)]
+        except ValueError:
+            raise ValueError(f"Unknown extra stream `{name}`")
+        return mapping[ms]
+
+    def _extend_alignment(self, final: bool) -> int:
+        """
+        Aligns touch timestamps after the cursor with all secondary streams in
+        one pass. Unless `final`, a sample is committed only if all secondary
+        streams have frames at or after it, so that no frame closer to it can be
+        appended later.
+        """
+        secondaries = [self._rgb_keys, self._depth_keys, *self._extra_keys]
+        if not final and not all(secondaries):
+            return 0
+        horizon = float("inf") if final else min(keys[-1] for keys in secondaries)
+
+        # the closest frames do not depend on the previous samples, and the gaps
+        # in linearized mode only depend on the previous touch timestamp, so the
+        # alignment can be restarted from the last committed sample
+        main_pos = 0 if self._cursor is None else self._cursor.main_pos
+        main = self._obs_keys[main_pos:]
+        if not main:
+            return 0
+        if self._linearize:
+            assert self._step is not None
+            if self._cursor is None:
+                main = linearize_timeline(main, self._step).tolist()
+            else:
+                main = [self._cursor.ms] + main
+                main = linearize_timeline(main, self._step)[1:].tolist()
+        committed = bisect.bisect_right(main, horizon)
+        if not committed:
+            return 0
+
+        timeline, indices = align_closest(main[:committed], secondaries)
+        values = np.stack(
+            [
+                np.asarray(keys, dtype=np.int64)[positions]
+                for keys, positions in zip(secondaries, indices)
+            ]
+        )
+        # samples with frames too far from the touch timestamp are pruned before
+        # any frame is loaded
+        exceeded = np.abs(values - timeline) > self._max_offsets[:, None]
+        if self._pruning == "drop":
+            kept = ~exceeded.any(axis=0)
+            timeline, values = timeline[kept], values[:, kept]
+        else:
+            values[exceeded] = PRUNED_MS
+        touch_ms = timeline.tolist()
+        self._aligned.extend(zip(touch_ms, *values.tolist()))
+        self._timeline.extend(touch_ms)
+
+        last_ms = main[committed - 1]
+        main_pos = bisect.bisect_right(self._obs_keys, last_ms, lo=main_pos)
+        self._cursor = _AlignmentCursor(last_ms, main_pos)
+        return len(touch_ms)
+
+    def refresh(self, final: bool = False) -> int:
+        """
+        Parses lines appended to the meta files since the previous refresh and
+        extends the aligned samples. With `final`, the recording is considered
+        complete and all remaining samples are committed. Returns the number of
+        new samples.
+        """
+        final = final or not self._follow
+        self._read_meta(final)
+        self._rgb_decoder = None  # the video may have new keyframes
+        return self._extend_alignment(final)
+
+    def iter_follow(
+        self, poll_interval: float = 1.0, idle_timeout: Optional[float] = None
+    ) -> Iterator[Union[DataItem, LazyDataItem]]:
+        """
+        Yields all samples, then keeps yielding new samples as the recording is
+        being written. Stops after no new samples appeared for `idle_timeout`
+        seconds (never by default).
+        NOTE: rgb frames can be decoded only if the video container is readable
+        while being written (e.g. fragmented mp4).
+        """
+        position = 0
+        last_update = time.monotonic()
+        while True:
+            for item in self._load_items(
+                self._aligned[position:], in_worker=False, sequential=False
+            ):
+                yield item
+                position += 1
+            if self.refresh():
+                last_update = time.monotonic()
+            elif (
+                idle_timeout is not None
+                and time.monotonic() - last_update >= idle_timeout
+            ):
+                if self.refresh(final=True) == 0:
+                    return
+            else:
+                time.sleep(poll_interval)
+
+    def share_frames(
+        self,
+        num_workers: int,
+        slots_per_worker: int = SLOTS_PER_WORKER,
+        prefetch_factor: int = 2,
+    ) -> SharedFrameRing:
+        """
+        Makes DataLoader workers pass frames through a ring of shared-memory
+        slots instead of pickling them. `prefetch_factor` must be the one of the
+        DataLoader. Items must be resolved in the main process with
+        `SharedFrameRing.consume`, e.g.:
+
+        >>> ds = MyDataset(root)
+        >>> with ds.share_frames(num_workers=4) as ring:
+        ...     loader = DataLoader(ds, batch_size=None, num_workers=4)
+        ...     for item in ring.consume(loader):
+        ...         ...
+        """
+        if self._lazy:
+            raise ValueError("Lazy items cannot be passed through shared memory")
+        if slots_per_worker < prefetch_factor + 2:
+            # a worker would wait for a slot held by the items prefetched from it
+            raise ValueError(
+                f"Expect at least {prefetch_factor + 2} slots per worker for "
+                f"prefetch factor {prefetch_factor}, got: {slots_per_worker}"
+            )
+        # NOTE: assuming all frames of a stream have the same size
+        slot_nbytes = 2 * ALIGNMENT
+        if "rgb" in self._modalities:
+            with open_video(self._video_path, self._decode_options) as video:
+                w, h = video.get_frame_size()
+            slot_nbytes += w * h * 3
+        if "depth" in self._modalities:
+            first_depth_frame = next(iter(self._depth_mapping.values()))
+            slot_nbytes += self._load_depth(first_depth_frame.ms)().nbytes
+        self._frame_ring = SharedFrameRing(slot_nbytes, num_workers, slots_per_worker)
+        return self._frame_ring
+
+    def __iter__(self) -> Iterator[Union[DataItem, LazyDataItem]]:
+        worker_info = _get_worker_info()
+        num_workers = worker_info.num_workers if worker_info else 1
+        worker_id = worker_info.id if worker_info else 0
+
+        if self._sampler is not None:
+            groups = self._iter_blocks(self._sampler, worker_id, num_workers)
+        else:
+            # workers take items in turns, so that the DataLoader (which fetches
+            # from workers in turns as well) keeps the original order
+            start = self._skip + worker_id
+            groups = iter([self._aligned[start::num_workers]])
+        for samples in groups:
+            items = self._load_items(
+                samples,
+                in_worker=worker_info is not None,
+                sequential=self._sampler is not None,
+            )
+            for item in items:
+                if self._frame_ring is not None and worker_info is not None:
+                    assert isinstance(item, DataItem), "not lazy"
+                    item = self._frame_ring.put(worker_id, item)
+                yield item
+
+    def _iter_blocks(
+        self, sampler: BlockShuffleSampler, worker_id: int, num_workers: int
+    ) -> Iterator[List[Tuple[int, ...]]]:
+        """
+        Yields samples of the blocks of the worker in the order to yield them.
+        """
+        # workers take whole blocks in turns, so that each block is decoded once
+        all_blocks = sampler.blocks(len(self._aligned))
+        blocks = all_blocks[worker_id::num_workers]
+        ends = list(accumulate(len(block) for block in blocks))
+        offset = 0
+        if self._skip:
+            if max(self._skip_num_workers, 1) != num_workers:
+                raise ValueError(
+                    f"The state was saved with {self._skip_num_workers} workers, "
+                    f"got: {num_workers}"
+                )
+            lengths = [
+                sum(len(block) for block in all_blocks[w::num_workers])
+                for w in range(num_workers)
+            ]
+            offset = round_robin_offsets(lengths, self._skip)[worker_id]
+        first = bisect.bisect_right(ends, offset)
+        for n in range(first, len(blocks)):
+            # only the samples remaining after the offset are loaded
+            order = sampler.order_within(blocks[n])
+            if n == first and offset:
+                skipped = offset - (ends[n - 1] if n else 0)
+                order = order[skipped:]
+            yield [self._aligned[i] for i in order]
+
+    def _load_items(
+        self, samples: Sequence[Tuple[int, ...]], in_worker: bool, sequential: bool
+    ) -> Iterator[Union[DataItem, LazyDataItem]]:
+        if self._lazy:
+            return map(self._load_lazy_item, samples)
+        rgb_ms = [sample[1] for sample in samples]
+        rgb_frames = self._load_rgb_frames(
+            [ms for ms in rgb_ms if ms != PRUNED_MS], in_worker, sequential
+        )
+        frames = (
+            empty_frame() if ms == PRUNED_MS else next(rgb_frames) for ms in rgb_ms
+        )
+        depth_frames = self._load_depth_frames([sample[2] for sample in samples])
+        observations = self._load_observations([sample[0] for sample in samples])
+        return map(self._load_item, samples, frames, depth_frames, observations)
+
+    def _load_item(
+        self,
+        sample: Tuple[int, ...],
+        rgb_frame: np.ndarray,
+        depth_frame: np.ndarray,
+        observation: Sequence[int],
+    ) -> DataItem:
+        ts_i, rgb_j, depth_k, *extra = sample
+        logger.debug(f"Loading touch ms {ts_i}, rgb ms {rgb_j}, depth ms {depth_k}")
+        return DataItem(
+            touch_timestamp_i=ts_i,
+            rgb_timestamp_j=rgb_j,
+            depth_timestamp_k=depth_k,
+            touch_i=observation,
+            rgb_j=rgb_frame,
+            depth_k=depth_frame,
+            extra_timestamps=dict(zip(self._extra_streams, extra)),
+        )
+
+    def _load_lazy_item(self, sample: Tuple[int, ...]) -> LazyDataItem:
+        ts_i, rgb_j, depth_k, *extra = sample
+        return LazyDataItem(
+            touch_timestamp_i=ts_i,
+            rgb_timestamp_j=rgb_j,
+            depth_timestamp_k=depth_k,
+            extra_timestamps=dict(zip(self._extra_streams, extra)),
+            load_touch=self._load_touch(ts_i),
+            load_rgb=self._load_rgb(rgb_j),
+            load_depth=self._load_depth(depth_k),
+        )
+
+    # loaders are partial functions, so that lazy items can be pickled
+
+    def _load_touch(self, ms: int) -> Callable[[], Sequence[int]]:
+        if "touch" not in self._modalities:
+            return partial(load_observation, None)
+        return partial(load_observation, self._obs_mapping.get(ms))
+
+    def _load_rgb(self, ms: int) -> Callable[[], np.ndarray]:
+        if "rgb" not in self._modalities or ms == PRUNED_MS:
+            return empty_frame
+        load = partial(load_rgb_frame, self._rgb_mapping[ms], self._decode_options)
+        if self._frame_cache is not None:
+            key = self._rgb_cache_key(ms)
+            return partial(self._frame_cache.get_or_load, key, load)  # type: ignore
+        return load
+
+    def _load_depth(self, ms: int) -> Callable[[], np.ndarray]:
+        if "depth" not in self._modalities or ms == PRUNED_MS:
+            return empty_frame
+        frame = self._depth_mapping[ms]
+        if self._depth_container is not None:
+            load = partial(self._depth_container.read_frame, frame)
+        else:
+            load = partial(load_depth_frame, frame)
+        if self._frame_cache is not None:
+            key = self._depth_cache_key(ms)
+            return partial(self._frame_cache.get_or_load, key, load)  # type: ignore
+        return load
+
+    def _depth_cache_key(self, ms: int) -> str:
+        return make_key(self._cache_root, "depth", self._depth_mapping[ms].id, None)
+
+    def _load_observations(self, timestamps: Sequence[int]) -> Iterator[Sequence[int]]:
+        if "touch" not in self._modalities:
+            return ([] for _ in timestamps)
+        observations = [self._obs_mapping.get(ms) for ms in timestamps]
+        if self._bulk_reader is None:
+            return (load_observation(obs) for obs in observations)
+
+        paths = [obs.file_path for obs in observations if obs is not None]
+        contents = self._bulk_reader.read(paths)
+        return (
+            [] if obs is None else parse_observation(obs, _next_contents(contents, obs))
+            for obs in observations
+        )
+
+    def _load_depth_frames(self, timestamps: Sequence[int]) -> Iterator[np.ndarray]:
+        if (
+            self._bulk_reader is None
+            or "depth" not in self._modalities
+            or self._depth_container is not None
+        ):
+            return (self._load_depth(ms)() for ms in timestamps)
+
+        # only the frames missing in the frame cache are read, hits are checked
+        # when the reader (ahead) or the decoder reaches them
+        plan, reader_plan = tee((ms, self._depth_to_read(ms)) for ms in timestamps)
+        paths = (
+            self._depth_mapping[ms].file_path for ms, read in reader_plan if read
+        )
+        contents = self._bulk_reader.read(paths)
+        return self._decode_depth_frames(plan, contents)
+
+    def _depth_to_read(self, ms: int) -> bool:
+        cache = self._frame_cache
+        return ms != PRUNED_MS and (
+            cache is None or self._depth_cache_key(ms) not in cache
+        )
+
+    def _decode_depth_frames(
+        self, plan: Iterator[Tuple[int, bool]], contents: Iterator[bytes]
+    ) -> Iterator[np.ndarray]:
+        last: Optional[Tuple[int, np.ndarray]] = None
+        for ms, read in plan:
+            if not read:
+                yield self._load_depth(ms)()
+                continue
+            meta = self._depth_mapping[ms]
+            data = _next_contents(contents, meta)
+            if last is None or last[0] != ms:  # consecutive samples share frames
+                last = ms, decode_depth_frame(meta, data)
+                if self._frame_cache is not None:
+                    self._frame_cache.put(self._depth_cache_key(ms), last[1])
+            yield last[1]
+
+    def _rgb_cache_key(self, ms: int) -> str:
+        # decoder threads do not change the frames
+        options = self._decode_options.backend
+        return make_key(self._cache_root, "rgb", self._rgb_mapping[ms].id, options)
+
+    def _load_rgb_frames(
+        self, timestamps: Sequence[int], in_worker: bool, sequential: bool = False
+    ) -> Iterator[np.ndarray]:
+        if "rgb" not in self._modalities:
+            return (empty_frame() for _ in timestamps)
+        if self._frame_cache is None:
+            return self._decode_rgb_frames(timestamps, in_worker, sequential)
+        if not sequential and not self._rgb_decode_workers:
+            # frames are decoded one by one, hits are checked when reached
+            return (self._load_rgb(ms)() for ms in timestamps)
+
+        # only the frames missing in the cache are decoded (planned up front)
+        keys = [self._rgb_cache_key(ms) for ms in timestamps]
+        hits = [key in self._frame_cache for key in keys]
+        misses = [ms for ms, hit in zip(timestamps, hits) if not hit]
+        decoded = self._decode_rgb_frames(misses, in_worker, sequential)
+        return self._cached_rgb_frames(timestamps, keys, hits, decoded)
+
+    def _cached_rgb_frames(
+        self,
+        timestamps: Sequence[int],
+        keys: Sequence[str],
+        hits: Sequence[bool],
+        decoded: Iterator[np.ndarray],
+    ) -> Iterator[np.ndarray]:
+        assert self._frame_cache is not None
+        for ms, key, hit in zip(timestamps, keys, hits):
+            if hit:
+                # the frame may have been evicted since the check
+                yield self._load_rgb(ms)()
+            else:
+                frame = next(decoded)
+                if frame is not None:
+                    self._frame_cache.put(key, frame)
+                yield frame
+
+    def _decode_rgb_frames(
+        self, timestamps: Sequence[int], in_worker: bool, sequential: bool
+    ) -> Iterator[np.ndarray]:
+        if sequential:
+            from dataset_loader.parallel_decode import decode_sequential
+
+            frames = decode_sequential(
+                self._video_path, timestamps, self._decode_options
+            )
+            return iter(frames)  # type: ignore
+        if self._rgb_decode_workers and in_worker:
+            # processes of the DataLoader are daemonic and cannot have children
+            logger.warning("Parallel rgb decoding is disabled in DataLoader workers")
+        elif self._rgb_decode_workers and timestamps:
+            if self._rgb_decoder is None:
+                from dataset_loader.parallel_decode import ParallelVideoDecoder
+
+                self._rgb_decoder = ParallelVideoDecoder(
+                    self._video_path,
+                    workers=self._rgb_decode_workers,
+                    options=self._decode_options,
+                )
+            return self._rgb_decoder.decode(timestamps)  # type: ignore
+        return (
+            load_rgb_frame(self._rgb_mapping[ms], self._decode_options)
+            for ms in timestamps
+        )
@@ -0,0 +1,72 @@
+"""
+Locality-aware shuffling of aligned samples.
+
+Fully random access to the video turns every sample into a seek to the previous
+keyframe plus decoding up to the frame. Instead, `BlockShuffleSampler` splits the
+samples into blocks of `block_size` consecutive samples and shuffles the order of
+the blocks: frames of a block are decoded sequentially after a single seek, and
+optionally the samples of a block are shuffled after decoding. To keep seeks rare,
+a block should span at least a group of pictures (GOP) of the video, e.g. with
+a keyframe every 250 frames and a sample per frame, `block_size >= 250`.
+"""
+from typing import List
+
+import numpy as np
+
+
+BLOCK_SIZE = 64  # samples
+
+
+class BlockShuffleSampler:
+    def __init__(
+        self,
+        block_size: int = BLOCK_SIZE,
+        *,
+        seed: int = 0,
+        shuffle_within: bool = False,
+    ) -> None:
+        if block_size < 1:
+            raise ValueError(f"Block size must be positive, got: {block_size}")
+        self._block_size = block_size
+        self._seed = seed
+        self._shuffle_within = shuffle_within
+        self._epoch = 0
+
+    @property
+    def block_size(self) -> int:
+        return self._block_size
+
+    @property
+    def seed(self) -> int:
+        return self._seed
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def set_epoch(self, epoch: int) -> None:
+        """
+        Sets the epoch of the next iteration, the order is a function of the seed
+        and the epoch only (so it is the same in all DataLoader workers).
+        """
+        self._epoch = epoch
+
+    def blocks(self, num_samples: int) -> List[range]:
+        """
+        Returns ranges of sample indices in the shuffled order of blocks.
+        """
+        rng = np.random.default_rng([self._seed, self._epoch])
+        starts = np.arange(0, num_samples, self._block_size)
+        return [
+            range(start, min(start + self._block_size, num_samples))
+            for start in rng.permutation(starts).tolist()
+        ]
+
+    def order_within(self, block: range) -> List[int]:
+        """
+        Returns the order of samples of the block to yield after decoding.
+        """
+        if not self._shuffle_within:
+            return list(block)
+        rng = np.random.default_rng([self._seed, self._epoch, block.start])
+        return rng.permutation(np.asarray(block)).tolist()
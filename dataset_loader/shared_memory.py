@@ -0,0 +1,234 @@
+"""
+Shared-memory handoff of frames from DataLoader workers to the main process.
+
+Each worker owns `slots_per_worker` preallocated slots of a single memory-mapped
+file (placed in `/dev/shm` when available). A worker copies the arrays of an item
+into its next free slot and sends only small `FrameRef`s through the result
+queue; the main process maps them back to zero-copy array views. The slot of an
+item is released when the next item is requested, so the views must not be used
+(or must be copied) after that.
+
+A worker blocks until its next slot is released (up to `timeout` seconds), so
+`slots_per_worker` must be at least `prefetch_factor + 2` of the DataLoader to
+avoid deadlocks.
+"""
+import mmap
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, TypeVar
+
+import numpy as np
+
+
+SHM_DIR = Path("/dev/shm")
+SLOTS_PER_WORKER = 4
+ALIGNMENT = 64  # bytes, alignment of arrays within a slot
+POLL_INTERVAL = 0.001  # seconds between checks of a busy slot
+ACQUIRE_TIMEOUT = 60.0  # seconds a worker waits for a busy slot
+
+_FREE = 0
+_BUSY = 1
+
+T = TypeVar("T", bound=Tuple[Any, ...])
+
+
+class FrameRef(NamedTuple):
+    slot: int
+    offset: int  # within the slot
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+def _aligned(nbytes: int) -> int:
+    return -(-nbytes // ALIGNMENT) * ALIGNMENT
+
+
+class SharedFrameRing:
+    def __init__(
+        self,
+        slot_nbytes: int,
+        num_workers: int,
+        slots_per_worker: int = SLOTS_PER_WORKER,
+        timeout: float = ACQUIRE_TIMEOUT,
+    ) -> None:
+        if num_workers < 1 or slots_per_worker < 1:
+            raise ValueError(
+                "Expect positive number of workers and slots per worker, "
+                f"got: {num_workers} and {slots_per_worker}"
+            )
+        self._slot_nbytes = _aligned(slot_nbytes)
+        self._timeout = timeout
+        self._slots_per_worker = slots_per_worker
+        self._num_slots = num_workers * slots_per_worker
+        self._header_nbytes = _aligned(self._num_slots)
+        self._nbytes = self._header_nbytes + self._num_slots * self._slot_nbytes
+
+        shm_dir = SHM_DIR if SHM_DIR.is_dir() else None
+        fd, path = tempfile.mkstemp(prefix="dataset-loader-", dir=shm_dir)
+        try:
+            os.ftruncate(fd, self._nbytes)  # zero-filled, all slots are free
+        finally:
+            os.close(fd)
+        self._path = Path(path)
+        self._owner = True
+        self._open()
+
+    def _open(self) -> None:
+        with self._path.open("r+b") as f:
+            self._map: Optional[mmap.mmap] = mmap.mmap(f.fileno(), self._nbytes)
+        self._states: Optional[np.ndarray] = np.frombuffer(
+            self._map, dtype=np.uint8, count=self._num_slots
+        )
+        self._cursor = 0  # next slot to use, relative to the worker's slots
+        self._held: Optional[Tuple[int, ...]] = None  # slots of the last item
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # workers re-open the mapping by path instead of pickling its contents
+        state = dict(self.__dict__)
+        del state["_map"], state["_states"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._owner = False
+        self._open()
+
+    def __enter__(self) -> "SharedFrameRing":
+        return self
+
+    def __exit__(self, type: Any, value: Any, tb: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._states = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # views are still alive, the mapping is closed with them
+            self._map = None
+        if self._owner and self._path.exists():
+            self._path.unlink()
+
+    @property
+    def slot_nbytes(self) -> int:
+        return self._slot_nbytes
+
+    def _acquire(self, worker_id: int) -> int:
+        assert self._states is not None, "ring is closed"
+        slot = worker_id * self._slots_per_worker + self._cursor
+        if slot >= self._num_slots:
+            raise ValueError(f"Worker id {worker_id} exceeds the number of workers")
+        deadline = time.monotonic() + self._timeout
+        while self._states[slot] != _FREE:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(
+                    f"Worker {worker_id} waited more than {self._timeout} s for "
+                    f"slot {slot} to be released, expect `slots_per_worker` of "
+                    "at least `prefetch_factor + 2` and items to be consumed"
+                )
+            time.sleep(POLL_INTERVAL)
+        self._cursor = (self._cursor + 1) % self._slots_per_worker
+        self._states[slot] = _BUSY
+        return slot
+
+    def put(self, worker_id: int, item: T) -> T:
+        """
+        Copies all array fields of the named tuple `item` into the next slot of
+        the worker and returns the item with these fields replaced by `FrameRef`s.
+        """
+        assert self._map is not None, "ring is closed"
+        arrays = {
+            name: np.ascontiguousarray(value)
+            for name, value in zip(item._fields, item)  # type: ignore
+            if isinstance(value, np.ndarray)
+        }
+        nbytes = sum(_aligned(array.nbytes) for array in arrays.values())
+        if nbytes > self._slot_nbytes:
+            raise ValueError(
+                f"Item requires {nbytes} bytes, slot size is {self._slot_nbytes}"
+            )
+
+        slot = self._acquire(worker_id)
+        base = self._header_nbytes + slot * self._slot_nbytes
+        offset = 0
+        refs = {}
+        for name, array in arrays.items():
+            view = np.frombuffer(
+                self._map, dtype=array.dtype, count=array.size, offset=base + offset
+            )
+            view[:] = array.reshape(-1)
+            refs[name] = FrameRef(
+                slot=slot, offset=offset, shape=array.shape, dtype=array.dtype.str
+            )
+            offset += _aligned(array.nbytes)
+        return item._replace(**refs)  # type: ignore
+
+    def view(self, ref: FrameRef) -> np.ndarray:
+        assert self._map is not None, "ring is closed"
+        dtype = np.dtype(ref.dtype)
+        shape = tuple(ref.shape)
+        count = int(np.prod(shape))
+        base = self._header_nbytes + ref.slot * self._slot_nbytes
+        array = np.frombuffer(
+            self._map, dtype=dtype, count=count, offset=base + ref.offset
+        )
+        return array.reshape(shape)
+
+    def release(self, slot: int) -> None:
+        assert self._states is not None, "ring is closed"
+        self._states[slot] = _FREE
+
+    def reset(self) -> None:
+        """
+        Frees all slots, e.g. those left busy by an interrupted iteration. Must
+        be called before the workers of the next epoch start.
+        """
+        assert self._states is not None, "ring is closed"
+        self._held = None
+        self._states[:] = _FREE
+
+    def resolve(self, item: T) -> T:
+        """
+        Replaces `FrameRef` fields of `item` with array views into the ring,
+        releasing the slots of the previously resolved item.
+        """
+        self._release_held()
+        refs = {
+            name: FrameRef(*value)
+            for name, value in zip(item._fields, item)  # type: ignore
+            if isinstance(value, FrameRef)
+        }
+        if not refs:
+            return item
+        self._held = tuple({ref.slot for ref in refs.values()})
+        views = {name: self.view(ref) for name, ref in refs.items()}
+        return item._replace(**views)  # type: ignore
+
+    def _release_held(self) -> None:
+        if self._held is not None:
+            for slot in self._held:
+                self.release(slot)
+            self._held = None
+
+    def consume(self, items: Iterable[T]) -> Iterator[T]:
+        """
+        Resolves items of a DataLoader created with `batch_size=None`.
+        Raises RuntimeError if slots are left busy by an interrupted previous
+        iteration, see `reset`.
+        """
+        assert self._states is not None, "ring is closed"
+        # checked before iterating `items`, i.e. before DataLoader workers start
+        busy = np.flatnonzero(self._states == _BUSY)
+        if busy.size:
+            raise RuntimeError(
+                f"Slots {busy.tolist()} are busy, shut down the previous "
+                "DataLoader iterator and call `reset` before a new epoch"
+            )
+        try:
+            for item in items:
+                yield self.resolve(item)
+        finally:
+            self._release_held()
@@ -1,4 +1,6 @@
-from typing import Iterator, Optional, Sequence, Tuple, Union
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
 
 
 def zip_closest(
@@ -74,3 +76,92 @@ def zip_closest(
         yield (m, s)
 
         m_prev = m
+
+
+def linearize_timeline(main: Sequence[int], step: int) -> np.ndarray:
+    """
+    Fills the gaps between elements of 'main' with elements with step 'step'
+    as `zip_closest(..., linearize=True)` does.
+    >>> linearize_timeline([1, 3, 10, 21], 5).tolist()
+    [1, 3, 8, 10, 15, 20, 21]
+    """
+    array = np.asarray(main, dtype=np.int64)
+    if len(array) < 2:
+        return array
+    fills = np.maximum((array[1:] - array[:-1] - 1) // step, 0)
+    counts = np.append(fills + 1, 1)  # each element followed by its fills
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    offsets = np.arange(counts.sum()) - starts
+    return np.repeat(array, counts) + step * offsets
+
+
+def align_closest(
+    main: Sequence[int],
+    secondaries: Sequence[Sequence[int]],
+    *,
+    linearize: bool = False,
+    step: Optional[int] = 1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized `zip_closest` of 'main' sequence with several sorted 'secondaries'
+    at once. Returns the (possibly linearized) 'main' sequence and an array
+    of shape (len(secondaries), len(main)) with indices of the closest elements
+    of each secondary sequence (the later one for elements at equal distance).
+    >>> a = [1, 2, 7, 8, 9, 15, 20]
+    >>> b = [0, 1, 4, 6, 9, 10]
+    >>> timeline, indices = align_closest(a, [b])
+    >>> np.asarray(b)[indices[0]].tolist()
+    [1, 1, 6, 9, 9, 10, 10]
+    """
+    if linearize and step is None:
+        raise ValueError("Option 'linearize' requires 'step' defined")
+    if linearize:
+        assert step is not None
+        timeline = linearize_timeline(main, step)
+    else:
+        timeline = np.asarray(main, dtype=np.int64)
+
+    indices = np.empty((len(secondaries), len(timeline)), dtype=np.int64)
+    for k, secondary in enumerate(secondaries):
+        array = np.asarray(secondary, dtype=np.int64)
+        if not len(array):
+            if len(timeline):
+                raise ValueError(
+                    "Got empty secondary sequence with non-empty main sequence"
+                )
+            continue
+        after = np.minimum(np.searchsorted(array, timeline), len(array) - 1)
+        before = np.maximum(after - 1, 0)
+        take_after = array[after] - timeline <= np.abs(timeline - array[before])
+        indices[k] = np.where(take_after, after, before)
+    return timeline, indices
+
+
+def round_robin_offsets(lengths: Sequence[int], consumed: int) -> List[int]:
+    """
+    Returns numbers of elements taken from sequences of 'lengths' after taking
+    'consumed' elements from them in turns, skipping exhausted sequences (as
+    DataLoader fetches items from workers).
+    >>> round_robin_offsets([3, 1, 2], 5)
+    [2, 1, 2]
+    """
+    if not 0 <= consumed <= sum(lengths):
+        raise ValueError(
+            f"Number of consumed elements must be in [0, {sum(lengths)}], "
+            f"got: {consumed}"
+        )
+    # the number of full turns is found by bisection
+    low, high = 0, max(lengths, default=0)
+    while low < high:
+        turns = (low + high + 1) // 2
+        if sum(min(length, turns) for length in lengths) <= consumed:
+            low = turns
+        else:
+            high = turns - 1
+    offsets = [min(length, low) for length in lengths]
+    remaining = consumed - sum(offsets)
+    for i, length in enumerate(lengths):
+        if remaining and length > low:
+            offsets[i] += 1
+            remaining -= 1
+    return offsets
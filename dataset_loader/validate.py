@@ -0,0 +1,259 @@
+"""
+Validation and indexing of many recordings without decoding any frame.
+
+For each recording, the meta files are parsed once with the same rules as by
+`MyDataset` (and timestamps must be increasing, without duplicated lines), the
+files of depth frames and observations are checked to exist, and the rgb
+timestamps are checked to refer to distinct frames of the video (according to
+the frame count of its headers, which differing from the number of rgb frames is
+a warning). Valid recordings are aligned from the parsed meta as by `MyDataset`,
+optionally saving the aligned timestamps to `ALIGNMENT_FILE_NAME`. Recordings
+are processed in parallel by a process pool (an unexpected exception fails only
+its recording) and the report is written as JSON.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Union,
+)
+
+import numpy as np
+
+from dataset_loader.recording import (
+    DEPTH_META_REL_PATH,
+    OBSERVATION_META_REL_PATH,
+    RGB_META_REL_PATH,
+    VIDEO_FILE_NAME,
+    ms_to_frame_index,
+    open_video,
+    read_depth_frames_meta,
+    read_observations_meta,
+    read_rgb_frames_meta,
+)
+from dataset_loader.utils import align_closest
+
+
+logger = logging.getLogger(__name__)
+
+ALIGNMENT_FILE_NAME = "alignment.npz"
+MAX_REPORTED_FILES = 10  # missing files listed per recording
+
+
+@dataclass
+class RecordingReport:
+    root: str
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    rgb_frames: int = 0
+    depth_frames: int = 0
+    observations: int = 0
+    video_frames: Optional[int] = None
+    samples: Optional[int] = None  # aligned samples
+    alignment_path: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), ok=self.ok)
+
+
+def _read_meta(
+    report: RecordingReport,
+    read: Callable[..., Mapping[int, Any]],
+    meta_file: Path,
+) -> Mapping[int, Any]:
+    try:
+        return read(meta_file, strict=True)
+    except (ValueError, OSError) as e:
+        report.errors.append(str(e))
+        return {}
+
+
+def _check_files_exist(
+    report: RecordingReport, kind: str, paths: Sequence[Path]
+) -> None:
+    # a single directory listing instead of a `stat` per file
+    names: Dict[Path, Set[str]] = {}
+    missing = []
+    for path in paths:
+        if path.parent not in names:
+            try:
+                names[path.parent] = set(os.listdir(path.parent))
+            except OSError:
+                names[path.parent] = set()
+        if path.name not in names[path.parent]:
+            missing.append(path.name)
+    if missing:
+        listed = ", ".join(missing[:MAX_REPORTED_FILES])
+        more = "" if len(missing) <= MAX_REPORTED_FILES else ", ..."
+        report.errors.append(
+            f"Missing {len(missing)} {kind} files in `{paths[0].parent}`: "
+            f"{listed}{more}"
+        )
+
+
+def _check_video(
+    report: RecordingReport, video_path: Path, rgb_ms: List[int]
+) -> Optional[float]:
+    """
+    Returns fps of the video.
+    """
+    try:
+        with open_video(video_path) as video:
+            fps = video.get_fps()
+            report.video_frames = video.get_frame_count()
+    except ValueError as e:
+        report.errors.append(str(e))
+        return None
+    if rgb_ms and report.video_frames:
+        last = ms_to_frame_index(max(rgb_ms), fps)
+        if last >= report.video_frames:
+            report.errors.append(
+                f"Video file `{video_path}` has {report.video_frames} frames, "
+                f"rgb timestamp {max(rgb_ms)} ms refers to frame {last}"
+            )
+    frames: Dict[int, int] = {}
+    for ms in rgb_ms:
+        index = ms_to_frame_index(ms, fps)
+        if index in frames:
+            report.errors.append(
+                f"Rgb timestamps {frames[index]} and {ms} ms refer to the same "
+                f"frame {index} of video file `{video_path}`"
+            )
+            break
+        frames[index] = ms
+    if report.video_frames is not None and report.video_frames != len(rgb_ms):
+        report.warnings.append(
+            f"Video file `{video_path}` has {report.video_frames} frames, "
+            f"rgb meta file has {len(rgb_ms)}"
+        )
+    return fps
+
+
+def validate_recording(
+    root: Union[str, Path], *, linearize: bool = False, save_alignment: bool = False
+) -> RecordingReport:
+    """
+    Validates the recording, see the module docstring.
+    """
+    root = Path(root)
+    report = RecordingReport(root=str(root))
+    rgb = _read_meta(report, read_rgb_frames_meta, root / RGB_META_REL_PATH)
+    depth = _read_meta(report, read_depth_frames_meta, root / DEPTH_META_REL_PATH)
+    obs = _read_meta(report, read_observations_meta, root / OBSERVATION_META_REL_PATH)
+    report.rgb_frames = len(rgb)
+    report.depth_frames = len(depth)
+    report.observations = len(obs)
+    _check_files_exist(report, "depth frame", [m.file_path for m in depth.values()])
+    _check_files_exist(report, "observation", [m.file_path for m in obs.values()])
+    video_path = (root / RGB_META_REL_PATH).parent / VIDEO_FILE_NAME
+    fps = _check_video(report, video_path, list(rgb))
+    if report.errors:
+        return report
+
+    # aligned from the parsed meta in the same way as by `MyDataset`
+    assert fps is not None
+    secondaries = [list(rgb), list(depth)]
+    try:
+        timeline, indices = align_closest(
+            list(obs), secondaries, linearize=linearize, step=int(1_000 / fps)
+        )
+    except ValueError as e:  # e.g. no frames
+        report.errors.append(str(e))
+        return report
+    report.samples = len(timeline)
+    if save_alignment:
+        path = root / ALIGNMENT_FILE_NAME
+        rgb_ms, depth_ms = (
+            np.asarray(keys, dtype=np.int64)[positions]
+            for keys, positions in zip(secondaries, indices)
+        )
+        np.savez(path, touch_ms=timeline, rgb_ms=rgb_ms, depth_ms=depth_ms)
+        report.alignment_path = str(path)
+    return report
+
+
+def _validate_or_fail(root: Union[str, Path], **kwargs: Any) -> RecordingReport:
+    try:
+        return validate_recording(root, **kwargs)
+    except Exception as e:  # e.g. a corrupted video, the others are validated
+        logger.exception(f"Failed to validate `{root}`")
+        return RecordingReport(root=str(root), errors=[f"{type(e).__name__}: {e}"])
+
+
+def validate_recordings(
+    roots: Sequence[Union[str, Path]],
+    *,
+    workers: Optional[int] = None,
+    linearize: bool = False,
+    save_alignment: bool = False,
+) -> List[RecordingReport]:
+    """
+    Validates recordings in `workers` processes (by default, number of CPUs).
+    """
+    validate = partial(
+        _validate_or_fail, linearize=linearize, save_alignment=save_alignment
+    )
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(validate, roots, chunksize=4))
+
+
+def _parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("roots", type=Path, nargs="+", help="dataset directories")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--linearize", action="store_true")
+    parser.add_argument(
+        "--save-alignment",
+        action="store_true",
+        help=f"save aligned timestamps to {ALIGNMENT_FILE_NAME} of valid recordings",
+    )
+    parser.add_argument(
+        "--output", type=Path, default=None, help="JSON report file (stdout if unset)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    reports = validate_recordings(
+        args.roots,
+        workers=args.workers,
+        linearize=args.linearize,
+        save_alignment=args.save_alignment,
+    )
+    failed = sum(not report.ok for report in reports)
+    result = {
+        "recordings": [report.to_dict() for report in reports],
+        "valid": len(reports) - failed,
+        "invalid": failed,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+    logger.info(f"Validated {len(reports)} recordings, {failed} invalid")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,4 +13,12 @@ setuptools.setup(
     ],
     python_requires=">=3.6",
     install_requires=["opencv-python==4.2.0.34", "Pillow==7.2.0", "torch>1.2.0"],
+    extras_require={"pyav": ["av"], "depth-container": ["zstandard", "lz4"]},
+    entry_points={
+        "console_scripts": [
+            "dataset-loader-generate=dataset_loader.generator:main",
+            "dataset-loader-pack-depth=dataset_loader.depth_container:main",
+            "dataset-loader-validate=dataset_loader.validate:main",
+        ],
+    },
 )
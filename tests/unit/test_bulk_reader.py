@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from dataset_loader import bulk_reader
+from dataset_loader.bulk_reader import BulkFileReader
+from dataset_loader.dataset_loader import MyDataset
+from dataset_loader.frame_cache import FrameCache
+
+
+def test_invalid_batch_size() -> None:
+    with pytest.raises(ValueError, match="got: 4, 0, 2"):
+        BulkFileReader(batch_size=0)
+
+
+def test_read_in_requested_order(tmp_path: Path) -> None:
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"file-{i:02}.txt"
+        path.write_text(f"data {i}")
+        paths.append(path)
+    requested = paths[::-1] + paths[:3] + paths[:3]
+    reader = BulkFileReader(workers=2, batch_size=4)
+    assert list(reader.read(requested)) == [path.read_bytes() for path in requested]
+    assert list(reader.read([])) == []
+
+
+def test_read_missing_file(tmp_path: Path) -> None:
+    (tmp_path / "a").write_text("a")
+    contents = BulkFileReader(batch_size=1).read([tmp_path / "a", tmp_path / "b"])
+    assert next(contents) == b"a"
+    with pytest.raises(FileNotFoundError):
+        next(contents)
+
+
+@pytest.mark.parametrize("linearize", [False, True])
+def test_dataset_with_bulk_reader(dataset_path: Path, linearize: bool) -> None:
+    expected = list(MyDataset(dataset_path, linearize=linearize))
+    ds = MyDataset(dataset_path, linearize=linearize, bulk_reader=BulkFileReader())
+    items = list(ds)
+    assert len(items) == len(expected)
+    for item, expected_item in zip(items, expected):
+        assert item.touch_i == expected_item.touch_i
+        assert (item.depth_k == expected_item.depth_k).all()
+
+
+def test_dataset_with_bulk_reader_and_frame_cache(
+    dataset_path: Path, tmp_path: Path
+) -> None:
+    expected = list(MyDataset(dataset_path))
+    cache = FrameCache(tmp_path)
+    for _ in range(2):  # reads, then takes from the cache
+        ds = MyDataset(dataset_path, bulk_reader=BulkFileReader(), frame_cache=cache)
+        for item, expected_item in zip(ds, expected):
+            assert (item.depth_k == expected_item.depth_k).all()
+
+
+def test_dataset_with_bulk_reader_missing_file(
+    dataset_path: Path, tmp_path: Path
+) -> None:
+    for src in dataset_path.glob("*/*.txt"):
+        dst = tmp_path / src.relative_to(dataset_path)
+        dst.parent.mkdir(exist_ok=True)
+        dst.write_text(src.read_text())
+    ds = MyDataset(tmp_path, modalities=["depth"], bulk_reader=BulkFileReader())
+    with pytest.raises(ValueError, match="Could not load depth frame file"):
+        list(ds)
+
+
+def test_read_ahead_next_batch(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    advised: List[Path] = []
+    monkeypatch.setattr(bulk_reader, "advise_will_need", advised.append)
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"file-{i}.txt"
+        path.write_text(f"data {i}")
+        paths.append(path)
+    reader = BulkFileReader(batch_size=2)
+    assert list(reader.read(paths)) == [path.read_bytes() for path in paths]
+    assert sorted(advised) == paths[2:], "all but the first batch"
@@ -1,5 +1,9 @@
+import pickle
+import subprocess
+import sys
 from pathlib import Path
 from textwrap import dedent
+from typing import Dict, List, Tuple
 
 import cv2
 import numpy as np
@@ -8,17 +12,27 @@ from torch import tensor
 from torch.utils.data import DataLoader
 
 from dataset_loader.dataset_loader import (
+    PRUNED_MS,
     VIDEO_FILE_NAME,
+    DataItem,
+    DecodeOptions,
     DepthFrameMeta,
+    LazyDataItem,
+    MetaFileTail,
     MyDataset,
     ObservationMeta,
+    PyAVVideo,
     RgbFrameMeta,
     Video,
+    load_depth_frame,
     load_observation,
+    load_rgb_frame,
+    ms_to_frame_index,
     read_depth_frames_meta,
     read_observations_meta,
     read_rgb_frames_meta,
 )
+from dataset_loader.generator import GeneratorConfig, StreamSpec, generate_dataset
 
 
 def test_read_depth_frames_meta_too_many_numbers(tmp_path: Path) -> None:
@@ -184,6 +198,48 @@ def test_read_observations_meta(tmp_path: Path) -> None:
 # TODO: test_read_observations_meta_invalid_frame_negative_frame_id
 
 
+class TestMetaFileTail:
+    def test_read_appended_lines(self, tmp_path: Path) -> None:
+        path = tmp_path / "per_frame_timestamps.txt"
+        path.write_text("; MILLISECOND ID\n000001000 000000\n000002000 0000")
+        tail: MetaFileTail[Dict[str, int]] = MetaFileTail(path, "test", dict)
+        assert tail.read(complete_lines_only=True) == {1000: {"id": 0, "ms": 1000}}
+        assert tail.offset == len("; MILLISECOND ID\n000001000 000000\n")
+
+        with path.open("a") as f:
+            f.write("01  ; comment\n\n000003000 000002\n")
+        assert tail.read(complete_lines_only=True) == {
+            2000: {"id": 1, "ms": 2000},
+            3000: {"id": 2, "ms": 3000},
+        }
+        assert tail.read(complete_lines_only=True) == {}
+
+    def test_read_incomplete_last_line(self, tmp_path: Path) -> None:
+        path = tmp_path / "per_frame_timestamps.txt"
+        path.write_text("000001000 000000\n000002000 000001")
+        tail: MetaFileTail[Dict[str, int]] = MetaFileTail(path, "test", dict)
+        assert list(tail.read()) == [1000, 2000]
+
+    def test_read_strict(self, tmp_path: Path) -> None:
+        path = tmp_path / "per_frame_timestamps.txt"
+        path.write_text("000001000 000000\n000001000 000001\n")
+        tail: MetaFileTail[Dict[str, int]] = MetaFileTail(path, "test", dict)
+        assert list(tail.read()) == [1000], "collapsed"
+        tail = MetaFileTail(path, "test", dict)
+        with pytest.raises(ValueError, match="line 2: .* got 1000 after 1000"):
+            tail.read(strict=True)
+
+    def test_read_error_line_number(self, tmp_path: Path) -> None:
+        path = tmp_path / "per_frame_timestamps.txt"
+        path.write_text("; comment\n000001000 000000\n")
+        tail: MetaFileTail[Dict[str, int]] = MetaFileTail(path, "test", dict)
+        tail.read()
+        with path.open("a") as f:
+            f.write("000002000 abc\n")
+        with pytest.raises(ValueError, match="Invalid test meta file .*: line 2"):
+            tail.read()
+
+
 class TestVideo:
     @pytest.fixture
     def video_path(self, dataset_path: Path) -> Path:
@@ -241,6 +297,103 @@ class TestVideo:
             assert isinstance(writer, cv2.VideoWriter)
 
 
+class TestPyAVVideo:
+    @pytest.fixture(autouse=True)
+    def require_pyav(self) -> None:
+        pytest.importorskip("av")
+
+    @pytest.fixture
+    def video_path(self, dataset_path: Path) -> Path:
+        return dataset_path / "rgb" / "video.mp4"
+
+    def test_open_not_exists(self, tmp_path: Path) -> None:
+        path = tmp_path / "not-exists.mp4"
+        with pytest.raises(ValueError, match="Could open video file"):
+            with PyAVVideo(path):
+                pass
+
+    def test_fps(self, video_path: Path) -> None:
+        with PyAVVideo(video_path) as video:
+            assert video.get_fps() == 30
+
+    def test_frame_size(self, video_path: Path) -> None:
+        with PyAVVideo(video_path) as video:
+            assert video.get_frame_size() == (256, 224)
+
+    def test_seek_read_frame_not_found(self, video_path: Path) -> None:
+        with PyAVVideo(video_path) as video:
+            assert video.seek_read_frame(100_500 * 1_000_000) is None
+
+
+def test_decode_options_invalid_backend() -> None:
+    with pytest.raises(ValueError, match="Decode backend must be one of"):
+        DecodeOptions(backend="gstreamer")
+
+
+def test_decode_options_invalid_threads() -> None:
+    with pytest.raises(ValueError, match="must be non-negative"):
+        DecodeOptions(threads=-1)
+
+
+@pytest.mark.parametrize(
+    "ms, fps, index", [(0, 30, 0), (16, 30, 0), (17, 30, 1), (2050, 30, 61)]
+)
+def test_ms_to_frame_index(ms: int, fps: float, index: int) -> None:
+    assert ms_to_frame_index(ms, fps) == index
+
+
+class TestFunctionLoadRgbFrame:
+    @pytest.fixture
+    def video_path(self, dataset_path: Path) -> Path:
+        return dataset_path / "rgb" / "video.mp4"
+
+    def test_load_rgb_frame_not_found(self, tmp_path: Path) -> None:
+        frame = RgbFrameMeta(id=0, ms=0, video_path=tmp_path / VIDEO_FILE_NAME)
+        with pytest.raises(ValueError, match="Could not load rgb frame file"):
+            load_rgb_frame(frame)
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            DecodeOptions(backend="ffmpeg"),
+            DecodeOptions(backend="ffmpeg", threads=1),
+            DecodeOptions(backend="ffmpeg", threads=4),
+            DecodeOptions(backend="pyav"),
+            DecodeOptions(backend="pyav", threads=4),
+        ],
+    )
+    def test_load_rgb_frame_equivalent_to_default(
+        self, video_path: Path, options: DecodeOptions
+    ) -> None:
+        if options.backend == "pyav":
+            pytest.importorskip("av")
+        for ms in (0, 17, 100, 2050, 4000, 6983):
+            frame = RgbFrameMeta(id=0, ms=ms, video_path=video_path)
+            with Video(video_path) as video:
+                expected = video.seek_read_frame(ms)
+            assert expected is not None
+            assert (load_rgb_frame(frame, options) == expected).all(), ms
+
+
+class TestFunctionLoadDepthFrame:
+    def test_load_depth_frame_not_found(self, tmp_path: Path) -> None:
+        frame = DepthFrameMeta(id=123, ms=100, base_dir=tmp_path)
+        with pytest.raises(ValueError, match="No such file or directory"):
+            load_depth_frame(frame)
+
+    def test_load_depth_frame_rgb(self, dataset_path: Path) -> None:
+        frame = DepthFrameMeta(id=1, ms=1166, base_dir=dataset_path / "depth")
+        data = load_depth_frame(frame)
+        assert data.shape == (224 * 256, 3)
+        assert data.dtype == np.int64
+
+    def test_load_depth_frame_uint16(self, tmp_path: Path) -> None:
+        image = np.arange(12, dtype=np.uint16).reshape(3, 4) * 5_000
+        assert cv2.imwrite(str(tmp_path / "frame-000007.png"), image)
+        frame = DepthFrameMeta(id=7, ms=100, base_dir=tmp_path)
+        assert load_depth_frame(frame).tolist() == image.reshape(-1).tolist()
+
+
 class TestFunctionLoadObservation:
     def test_load_observation_none(self) -> None:
         assert load_observation(None) == []
@@ -357,3 +510,317 @@ class TestMyDataset:
             ((tensor([462]), tensor([500]), tensor([1166]))),
             ((tensor([495]), tensor([500]), tensor([1166]))),
         ]
+
+    def test_multiple_workers_keep_order(self, dataset_path: Path) -> None:
+        ds = MyDataset(dataset_path)
+        expected = [item.touch_timestamp_i for item in ds]
+        data = list(DataLoader(ds, batch_size=None, num_workers=3))
+        assert [item.touch_timestamp_i for item in data] == expected
+
+    def test_shared_frames(self, dataset_path: Path) -> None:
+        ds = MyDataset(dataset_path)
+        expected = list(ds)
+        with ds.share_frames(num_workers=2) as ring:
+            loader = DataLoader(ds, batch_size=None, num_workers=2)
+            data = [
+                (item.touch_timestamp_i, item.rgb_j.copy(), item.depth_k.copy())
+                for item in ring.consume(loader)
+            ]
+        assert len(data) == len(expected)
+        for (ts, rgb, depth), item in zip(data, expected):
+            assert ts == item.touch_timestamp_i
+            assert (rgb == item.rgb_j).all()
+            assert (depth == item.depth_k).all()
+
+    def test_shared_frames_too_few_slots(self, dataset_path: Path) -> None:
+        ds = MyDataset(dataset_path)
+        with pytest.raises(ValueError, match="at least 6 slots per worker"):
+            ds.share_frames(num_workers=2, slots_per_worker=4, prefetch_factor=4)
+
+    def test_extra_streams(self, tmp_path: Path) -> None:
+        config = GeneratorConfig(
+            rgb=StreamSpec(count=40, rate=20),
+            depth=StreamSpec(count=20, rate=10, jitter_ms=10, gap_prob=0.3),
+            touch=StreamSpec(count=10, rate=5, start_ms=20),
+            frame_size=(16, 8),
+        )
+        generate_dataset(tmp_path, config, workers=1)
+        # the extra streams repeat the depth and rgb timestamps
+        for name, src in (("imu", "depth"), ("camera", "rgb")):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "per_frame_timestamps.txt").write_text(
+                (tmp_path / src / "per_frame_timestamps.txt").read_text()
+            )
+
+        ds = MyDataset(tmp_path, extra_streams=["imu", "camera"])
+        items = list(ds)
+        assert len(items) == config.touch.count
+        for item in items:
+            assert item.extra_timestamps == {
+                "imu": item.depth_timestamp_k,
+                "camera": item.rgb_timestamp_j,
+            }
+        frame = ds.get_extra_frame("imu", items[0].extra_timestamps["imu"])
+        assert frame.base_dir == tmp_path / "imu"
+        with pytest.raises(ValueError, match="Unknown extra stream `audio`"):
+            ds.get_extra_frame("audio", 0)
+
+        batch = next(iter(DataLoader(ds, batch_size=4)))
+        assert batch.extra_timestamps["imu"].tolist() == [
+            item.depth_timestamp_k for item in items[:4]
+        ]
+
+    def test_no_extra_streams(self, dataset_path: Path) -> None:
+        item = next(iter(MyDataset(dataset_path)))
+        assert item.extra_timestamps == {}
+        default = DataItem(0, [], np.zeros(1), np.zeros(1), 0, 0)
+        with pytest.raises(TypeError):  # the default is shared by all items
+            default.extra_timestamps["imu"] = 0  # type: ignore
+
+    @pytest.mark.parametrize("num_workers", [0, 2])
+    def test_resume(self, dataset_path: Path, num_workers: int) -> None:
+        ds = MyDataset(dataset_path, linearize=True)
+        expected = [item.touch_timestamp_i for item in ds]
+        state = ds.state_dict(consumed=50, num_workers=num_workers)
+        assert state["touch_ms"] == expected[49]
+
+        ds = MyDataset(dataset_path, linearize=True)
+        ds.load_state_dict(state)
+        loader = DataLoader(ds, batch_size=None, num_workers=num_workers)
+        assert len(ds) == len(loader) == len(expected) - 50
+        data = [item.touch_timestamp_i for item in loader]
+        assert data == expected[50:]
+        assert ds.state_dict(consumed=10)["consumed"] == 60
+
+        ds.set_epoch(1)
+        assert len(ds) == len(expected)
+        assert [item.touch_timestamp_i for item in ds] == expected
+
+    def test_state_dict_invalid_consumed(self, dataset_path: Path) -> None:
+        ds = MyDataset(dataset_path)
+        with pytest.raises(ValueError, match=r"must be in \[0, 10\], got: 11"):
+            ds.state_dict(consumed=11)
+
+    def test_modalities(self, dataset_path: Path, tmp_path: Path) -> None:
+        # only meta files and observations are copied
+        for rel_path in ("rgb", "depth", "touch"):
+            (tmp_path / rel_path).mkdir()
+        for src in dataset_path.glob("*/*.txt"):
+            (tmp_path / src.relative_to(dataset_path)).write_text(src.read_text())
+
+        expected = list(MyDataset(dataset_path))
+        items = list(MyDataset(tmp_path, modalities=["touch"]))
+        assert len(items) == len(expected)
+        for item, expected_item in zip(items, expected):
+            assert item.touch_i == expected_item.touch_i
+            assert item.rgb_timestamp_j == expected_item.rgb_timestamp_j
+            assert item.depth_timestamp_k == expected_item.depth_timestamp_k
+            assert item.rgb_j.size == 0
+            assert item.depth_k.size == 0
+
+    def test_linearize_without_rgb(self, dataset_path: Path) -> None:
+        expected = list(MyDataset(dataset_path, linearize=True))
+        with pytest.raises(ValueError, match="requires `step_ms`"):
+            MyDataset(dataset_path, linearize=True, modalities=["touch", "depth"])
+        ds = MyDataset(
+            dataset_path, linearize=True, modalities=["touch", "depth"], step_ms=33
+        )
+        items = list(ds)
+        assert [item.touch_timestamp_i for item in items] == [
+            item.touch_timestamp_i for item in expected
+        ]
+        assert all(item.rgb_j.size == 0 for item in items)
+
+    def test_invalid_modalities(self, dataset_path: Path) -> None:
+        with pytest.raises(ValueError, match=r"got: \['audio'\]"):
+            MyDataset(dataset_path, modalities=["touch", "audio"])
+
+    def test_max_offset_drop(self, dataset_path: Path) -> None:
+        ds = MyDataset(dataset_path, max_offset_ms={"rgb": 33, "depth": 200})
+        assert len(ds) == 4
+        data_timestamps = [
+            (item.touch_timestamp_i, item.rgb_timestamp_j, item.depth_timestamp_k)
+            for item in ds
+        ]
+        assert data_timestamps == [
+            (2833, 2800, 2833),
+            (4000, 4000, 4166),
+            (5000, 5000, 5166),
+            (6033, 6000, 5833),
+        ]
+
+    def test_max_offset_mark(self, dataset_path: Path) -> None:
+        ds = MyDataset(dataset_path, max_offset_ms={"depth": 200}, pruning="mark")
+        assert len(ds) == 10
+        items = list(ds)
+        pruned = [item.touch_timestamp_i for item in items if item.depth_k.size == 0]
+        assert pruned == [33, 2100, 6366, 6500, 6600]
+        for item in items:
+            assert (item.depth_timestamp_k == PRUNED_MS) == (item.depth_k.size == 0)
+            assert item.rgb_j.size > 0
+
+    def test_max_offset_invalid(self, dataset_path: Path) -> None:
+        with pytest.raises(ValueError, match=r"got: \['imu'\]"):
+            MyDataset(dataset_path, max_offset_ms={"imu": 10})
+        with pytest.raises(ValueError, match="Pruning must be one of"):
+            MyDataset(dataset_path, pruning="skip")
+
+    def test_lazy(self, dataset_path: Path) -> None:
+        expected = list(MyDataset(dataset_path, modalities=["rgb", "depth"]))
+        items = list(MyDataset(dataset_path, modalities=["rgb", "depth"], lazy=True))
+        assert len(items) == len(expected)
+        assert items[0]._loaded == {}, "nothing is loaded before access"
+        items = pickle.loads(pickle.dumps(items))
+        for item, expected_item in zip(items, expected):
+            assert isinstance(item, LazyDataItem)
+            assert item.touch_i == []
+            assert (item.rgb_j == expected_item.rgb_j).all()
+            assert item.rgb_j is item.rgb_j, "loaded once"
+            assert (item.to_item().depth_k == expected_item.depth_k).all()
+
+        with pytest.raises(ValueError, match="Lazy items cannot be passed"):
+            MyDataset(dataset_path, lazy=True).share_frames(num_workers=1)
+
+
+class TestMyDatasetFollow:
+    META_FILES = (
+        "rgb/per_frame_timestamps.txt",
+        "depth/per_frame_timestamps.txt",
+        "touch/per_observation_timestamps.txt",
+    )
+
+    @pytest.fixture
+    def recorded_path(self, tmp_path: Path) -> Path:
+        config = GeneratorConfig(
+            rgb=StreamSpec(count=100, rate=30),
+            depth=StreamSpec(count=50, rate=15, jitter_ms=5, gap_prob=0.3),
+            touch=StreamSpec(count=15, rate=5, start_ms=10, gap_prob=0.3),
+            frame_size=(16, 8),
+        )
+        path = tmp_path / "recorded"
+        generate_dataset(path, config, workers=1)
+        return path
+
+    def _timestamps(self, ds: MyDataset) -> List[Tuple[int, int, int]]:
+        return [
+            (item.touch_timestamp_i, item.rgb_timestamp_j, item.depth_timestamp_k)
+            for item in ds
+        ]
+
+    def _start_recording(self, recorded_path: Path, tmp_path: Path) -> Path:
+        """
+        Copies the data files of a recording leaving the meta files with headers
+        only, as if the recording was just started.
+        """
+        path = tmp_path / "recording"
+        for src in recorded_path.rglob("*"):
+            if src.is_file():
+                dst = path / src.relative_to(recorded_path)
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                text = src.read_bytes()
+                if str(src.relative_to(recorded_path)) in self.META_FILES:
+                    text = b"".join(
+                        line for line in text.splitlines(True) if line[:1] == b";"
+                    )
+                dst.write_bytes(text)
+        return path
+
+    def _append(self, recorded_path: Path, path: Path, until_ms: int) -> None:
+        """
+        Appends meta lines with timestamps up to `until_ms` and half of the next
+        line, as if it was being written.
+        """
+        for rel_path in self.META_FILES:
+            lines = [
+                line
+                for line in (recorded_path / rel_path).read_text().splitlines(True)
+                if not line.startswith(";")
+            ]
+            written = (path / rel_path).read_text()
+            written = written[: written.rfind("\n") + 1]
+            data_lines = [
+                line for line in written.splitlines(True) if not line.startswith(";")
+            ]
+            header = written[: len(written) - len("".join(data_lines))]
+            new = [line for line in lines if int(line.split()[0]) <= until_ms]
+            partial = lines[len(new)][:5] if len(new) < len(lines) else ""
+            (path / rel_path).write_text(header + "".join(new) + partial)
+
+    @pytest.mark.parametrize("linearize", [False, True])
+    def test_refresh_matches_full_read(
+        self, recorded_path: Path, tmp_path: Path, linearize: bool
+    ) -> None:
+        path = self._start_recording(recorded_path, tmp_path)
+        ds = MyDataset(path, linearize=linearize, follow=True)
+        assert self._timestamps(ds) == []
+
+        committed: List[Tuple[int, int, int]] = []
+        for until_ms in range(0, 3_500, 250):
+            self._append(recorded_path, path, until_ms)
+            ds.refresh()
+            timestamps = self._timestamps(ds)
+            assert timestamps[: len(committed)] == committed, "never changed"
+            committed = timestamps
+        self._append(recorded_path, path, 100_000)
+        ds.refresh(final=True)
+
+        expected = self._timestamps(MyDataset(recorded_path, linearize=linearize))
+        assert self._timestamps(ds) == expected
+
+    def test_iter_follow(self, recorded_path: Path, tmp_path: Path) -> None:
+        path = self._start_recording(recorded_path, tmp_path)
+        self._append(recorded_path, path, 1_000)
+        ds = MyDataset(path, follow=True)
+        items = ds.iter_follow(poll_interval=0.01, idle_timeout=0.1)
+        first = next(items)
+        self._append(recorded_path, path, 100_000)
+        timestamps = [first.touch_timestamp_i] + [
+            item.touch_timestamp_i for item in items
+        ]
+        expected = [item.touch_timestamp_i for item in MyDataset(recorded_path)]
+        assert timestamps == expected
+
+    def test_meta_file_created_later(
+        self, recorded_path: Path, tmp_path: Path
+    ) -> None:
+        path = self._start_recording(recorded_path, tmp_path)
+        obs_meta = path / self.META_FILES[2]
+        obs_meta.unlink()
+        ds = MyDataset(path, follow=True)
+        assert ds.refresh() == 0, "polled without the observations meta file"
+
+        for rel_path in self.META_FILES:
+            (path / rel_path).write_bytes((recorded_path / rel_path).read_bytes())
+        items = ds.iter_follow(poll_interval=0.01, idle_timeout=0.1)
+        timestamps = [item.touch_timestamp_i for item in items]
+        expected = [item.touch_timestamp_i for item in MyDataset(recorded_path)]
+        assert timestamps == expected
+
+
+def test_import_without_frame_backends() -> None:
+    code = (
+        "import sys, dataset_loader.dataset_loader; "
+        "assert not {'cv2', 'PIL'} & set(sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_touch_only_without_torch(dataset_path: Path) -> None:
+    code = dedent(
+        f"""
+        import sys
+        from pathlib import Path
+        from dataset_loader import DataItem
+        from dataset_loader.recording import Recording, read_observations_meta
+
+        root = Path("{dataset_path}")
+        items = list(Recording(root, modalities=["touch"]))
+        assert len(items) == 10 and isinstance(items[0], DataItem)
+        assert items[0].touch_i, "loaded"
+        ds = Recording(root, True, modalities=["touch", "depth"], step_ms=33)
+        assert len(ds) > 10, "linearized without opening the video"
+        read_observations_meta(root / "touch/per_observation_timestamps.txt")
+        assert not {{"torch", "cv2", "PIL"}} & set(sys.modules)
+        """
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,117 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from dataset_loader.dataset_loader import (
+    MyDataset,
+    load_depth_frame,
+    read_depth_frames_meta,
+)
+from dataset_loader.depth_container import (
+    CODECS,
+    DEPTH_CONTAINER_FILE_NAME,
+    DepthContainer,
+    available_codecs,
+    convert_depth_frames,
+    main,
+    open_depth_container,
+)
+from dataset_loader.generator import GeneratorConfig, StreamSpec, generate_dataset
+
+
+@pytest.fixture
+def depth_meta_path(dataset_path: Path, tmp_path: Path) -> Path:
+    shutil.copytree(dataset_path / "depth", tmp_path / "depth")
+    return tmp_path / "depth" / "per_frame_timestamps.txt"
+
+
+@pytest.fixture
+def uint16_depth_meta_path(tmp_path: Path) -> Path:
+    config = GeneratorConfig(
+        rgb=StreamSpec(count=1, rate=1),
+        depth=StreamSpec(count=40, rate=15, gap_prob=0.2),
+        touch=StreamSpec(count=1, rate=1),
+        frame_size=(32, 16),
+    )
+    generate_dataset(tmp_path / "synthetic", config, workers=1)
+    return tmp_path / "synthetic" / "depth" / "per_frame_timestamps.txt"
+
+
+def test_available_codecs() -> None:
+    codecs = available_codecs()
+    assert codecs[-2:] == ["zlib", "none"], "always available"
+
+
+def test_convert_unknown_codec(depth_meta_path: Path) -> None:
+    with pytest.raises(ValueError, match="Unknown codec"):
+        convert_depth_frames(depth_meta_path, codec="brotli")
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("delta", [True, False])
+def test_roundtrip_uint16(
+    uint16_depth_meta_path: Path, codec: str, delta: bool
+) -> None:
+    if codec not in available_codecs():
+        pytest.skip(f"codec {codec} is not installed")
+    path = convert_depth_frames(
+        uint16_depth_meta_path, chunk_size=7, codec=codec, delta=delta
+    )
+    assert path == uint16_depth_meta_path.parent / DEPTH_CONTAINER_FILE_NAME
+
+    container = DepthContainer(path)
+    meta = read_depth_frames_meta(uint16_depth_meta_path)
+    assert len(container) == len(meta)
+    for frame in meta.values():
+        assert container.read_image(frame.id).dtype == np.uint16
+        assert (container.read_frame(frame) == load_depth_frame(frame)).all()
+
+
+def test_roundtrip_rgb_depth(depth_meta_path: Path) -> None:
+    container = DepthContainer(convert_depth_frames(depth_meta_path, chunk_size=4))
+    for frame in read_depth_frames_meta(depth_meta_path).values():
+        expected = load_depth_frame(frame)
+        actual = container.read_frame(frame)
+        assert actual.shape == expected.shape
+        assert (actual == expected).all()
+
+
+def test_read_chunk(depth_meta_path: Path) -> None:
+    container = DepthContainer(convert_depth_frames(depth_meta_path, chunk_size=4))
+    assert container.read_chunk(0).shape == (4, 224, 256, 3)
+    assert container.read_chunk(0) is container.read_chunk(0), "cached"
+
+
+def test_read_unknown_frame(depth_meta_path: Path) -> None:
+    container = DepthContainer(convert_depth_frames(depth_meta_path))
+    assert 1 in container
+    assert 100_500 not in container
+    with pytest.raises(ValueError, match="Depth frame 100500 not found"):
+        container.read_image(100_500)
+
+
+def test_invalid_container(tmp_path: Path) -> None:
+    path = tmp_path / DEPTH_CONTAINER_FILE_NAME
+    path.write_bytes(b"not a container at all")
+    with pytest.raises(ValueError, match="Invalid depth container file"):
+        DepthContainer(path)
+
+
+def test_container_not_found(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="No such file or directory"):
+        open_depth_container(tmp_path / "per_frame_timestamps.txt")
+
+
+def test_dataset_with_depth_container(dataset_path: Path, tmp_path: Path) -> None:
+    root = tmp_path / "my_dataset"
+    shutil.copytree(dataset_path, root)
+    main([str(root), "--chunk-size=5"])
+
+    expected = list(MyDataset(root))
+    items = list(MyDataset(root, depth_container=True))
+    assert len(items) == len(expected)
+    for item, expected_item in zip(items, expected):
+        assert item.depth_timestamp_k == expected_item.depth_timestamp_k
+        assert (item.depth_k == expected_item.depth_k).all()
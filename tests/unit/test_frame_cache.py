@@ -0,0 +1,154 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+import pytest
+
+from dataset_loader import recording
+from dataset_loader.dataset_loader import DecodeOptions, MyDataset
+from dataset_loader.frame_cache import FrameCache, make_key
+
+
+def test_invalid_max_bytes(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="Max cache size must be positive"):
+        FrameCache(tmp_path, max_bytes=0)
+
+
+def test_make_key(tmp_path: Path) -> None:
+    key = make_key(tmp_path, "rgb", 1, DecodeOptions())
+    assert key == make_key(tmp_path / "." / "", "rgb", 1, DecodeOptions())
+    assert key != make_key(tmp_path, "depth", 1, DecodeOptions())
+    assert key != make_key(tmp_path, "rgb", 2, DecodeOptions())
+    assert key != make_key(tmp_path, "rgb", 1, DecodeOptions(backend="pyav"))
+    assert key != make_key(tmp_path / "other", "rgb", 1, DecodeOptions())
+
+
+def test_put_get(tmp_path: Path) -> None:
+    cache = FrameCache(tmp_path)
+    assert "key" not in cache
+    assert cache.get("key") is None
+
+    frame = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    cache.put("key", frame)
+    assert "key" in cache
+    cached = cache.get("key")
+    assert cached is not None
+    assert (cached == frame).all()
+    assert cached.dtype == frame.dtype
+    assert not cached.flags.writeable
+    assert not list(tmp_path.rglob(".tmp-*"))
+
+
+def test_get_or_load(tmp_path: Path) -> None:
+    cache = FrameCache(tmp_path)
+    loaded: List[int] = []
+
+    def load() -> np.ndarray:
+        loaded.append(1)
+        return np.ones(3)
+
+    for _ in range(3):
+        frame = cache.get_or_load("key", load)
+        assert frame is not None and (frame == 1).all()
+    assert len(loaded) == 1
+    assert cache.get_or_load("none", lambda: None) is None
+    assert "none" not in cache
+
+
+def test_evict_least_recently_used(tmp_path: Path) -> None:
+    frame = np.zeros(1_000, dtype=np.uint8)
+    cache = FrameCache(tmp_path, max_bytes=10 ** 6)
+    for i in range(5):
+        cache.put(f"key{i}", frame)
+        os.utime(cache._path(f"key{i}"), (i, i))
+    cache.get("key0")  # used recently
+
+    file_nbytes = cache.size() // 5
+    cache = FrameCache(tmp_path, max_bytes=3 * file_nbytes)
+    cache.evict()
+    assert [f"key{i}" in cache for i in range(5)] == [True, False, False, True, True]
+
+
+def test_evict_on_open(tmp_path: Path) -> None:
+    frame = np.zeros(1_000, dtype=np.uint8)
+    cache = FrameCache(tmp_path)
+    for i in range(5):
+        cache.put(f"key{i}", frame)
+    cache = FrameCache(tmp_path, max_bytes=cache.size() // 2)
+    assert cache.size() <= cache.max_bytes
+
+
+def test_cap_shared_by_instances(tmp_path: Path) -> None:
+    # e.g. many jobs or DataLoader workers, each writing few frames
+    max_bytes = 16 * 1024
+    for i in range(50):
+        FrameCache(tmp_path, max_bytes=max_bytes).put(f"key{i}", np.zeros(800))
+    file_nbytes = FrameCache(tmp_path)._path("key49").stat().st_size
+    assert FrameCache(tmp_path, max_bytes=10 ** 9).size() <= max_bytes + file_nbytes
+
+
+def test_put_evicted_concurrently(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = FrameCache(tmp_path)
+    replace = os.replace
+
+    def replace_and_evict(src: Any, dst: Any) -> None:
+        replace(src, dst)
+        os.unlink(dst)  # by another process, before `put` returns
+
+    monkeypatch.setattr(os, "replace", replace_and_evict)
+    cache.put("key", np.zeros(10))
+    assert "key" not in cache
+
+
+def _put(root: Path) -> None:
+    cache = FrameCache(root)
+    for _ in range(20):
+        cache.put("key", np.arange(100_000))
+
+
+def test_concurrent_writers(tmp_path: Path) -> None:
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        for future in [executor.submit(_put, tmp_path) for _ in range(3)]:
+            future.result()
+    frame = FrameCache(tmp_path).get("key")
+    assert frame is not None and (frame == np.arange(100_000)).all()
+
+
+def test_dataset_with_frame_cache(
+    dataset_path: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    expected = list(MyDataset(dataset_path))
+    cache = FrameCache(tmp_path)
+    assert len(list(MyDataset(dataset_path, frame_cache=cache))) == len(expected)
+
+    def fail(*args: object) -> None:
+        raise AssertionError("decoded instead of taken from the cache")
+
+    monkeypatch.setattr(recording, "load_rgb_frame", fail)
+    monkeypatch.setattr(recording, "load_depth_frame", fail)
+    for lazy in (False, True):
+        items = list(MyDataset(dataset_path, frame_cache=cache, lazy=lazy))
+        assert len(items) == len(expected)
+        for item, expected_item in zip(items, expected):
+            assert (item.rgb_j == expected_item.rgb_j).all()
+            assert (item.depth_k == expected_item.depth_k).all()
+
+
+def test_dataset_checks_cache_lazily(
+    dataset_path: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    keys: List[str] = []
+    make_key = recording.make_key
+
+    def counting_make_key(*args: Any) -> str:
+        keys.append(make_key(*args))
+        return keys[-1]
+
+    monkeypatch.setattr(recording, "make_key", counting_make_key)
+    ds = MyDataset(dataset_path, frame_cache=FrameCache(tmp_path))
+    next(iter(ds))
+    assert len(keys) == 2, "rgb and depth keys of the first item only"
@@ -0,0 +1,156 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from dataset_loader.dataset_loader import (
+    MyDataset,
+    Video,
+    load_depth_frame,
+    load_observation,
+    read_depth_frames_meta,
+    read_observations_meta,
+    read_rgb_frames_meta,
+)
+from dataset_loader.generator import (
+    GeneratorConfig,
+    StreamSpec,
+    generate_dataset,
+    main,
+    make_depth_frame,
+    make_observation,
+    make_rgb_frame,
+    make_timestamps,
+    video_frame_ids,
+)
+
+
+@pytest.fixture
+def config() -> GeneratorConfig:
+    return GeneratorConfig(
+        rgb=StreamSpec(count=40, rate=20),
+        depth=StreamSpec(count=20, rate=10, start_ms=50, jitter_ms=10, gap_prob=0.3),
+        touch=StreamSpec(count=10, rate=5, start_ms=20, gap_prob=0.2),
+        frame_size=(64, 48),
+        observation_size=3,
+        seed=42,
+    )
+
+
+def test_stream_spec_invalid_jitter() -> None:
+    with pytest.raises(ValueError, match="to keep timestamps ordered"):
+        StreamSpec(count=10, rate=10, jitter_ms=50)
+
+
+def test_config_invalid_rgb_jitter() -> None:
+    # 30 fps: frames 0 and 1 at 5 and 38 ms, jittered to 17 and 26 ms, are both
+    # seeked to video frame 1
+    with pytest.raises(ValueError, match="can map timestamps to the same video"):
+        GeneratorConfig(rgb=StreamSpec(count=10, rate=30, start_ms=5, jitter_ms=12))
+    GeneratorConfig(rgb=StreamSpec(count=10, rate=30, start_ms=5, jitter_ms=11))
+
+
+def test_stream_spec_invalid_gap_prob() -> None:
+    with pytest.raises(ValueError, match="Gap probability must be in"):
+        StreamSpec(count=10, rate=10, gap_prob=1)
+
+
+def test_make_timestamps_sorted_with_gaps() -> None:
+    spec = StreamSpec(count=1_000, rate=30, jitter_ms=10, gap_prob=0.5)
+    ms, ids = make_timestamps(spec, np.random.default_rng(0))
+    assert len(ms) == len(ids)
+    assert 300 < len(ids) < 700
+    assert (np.diff(ms) > 0).all()
+    assert (np.diff(ids) > 0).all()
+
+
+def test_video_frame_ids() -> None:
+    ms = np.array([1000, 1110, 1190])
+    ids = np.array([0, 2, 3])
+    # frames 0..9 precede the first timestamp, 1110 ms is frame 11
+    assert video_frame_ids(ms, ids, 10) == [0] * 11 + [2, 3]
+    with pytest.raises(ValueError, match="must map to distinct video frames"):
+        video_frame_ids(np.array([1000, 1040]), np.array([0, 1]), 10)
+
+
+def test_generate_dataset_rgb_start_and_jitter(tmp_path: Path) -> None:
+    config = GeneratorConfig(
+        rgb=StreamSpec(count=30, rate=20, start_ms=1000, jitter_ms=20, gap_prob=0.2),
+        depth=StreamSpec(count=1, rate=1),
+        touch=StreamSpec(count=1, rate=1),
+        frame_size=(64, 48),
+    )
+    generate_dataset(tmp_path, config, workers=1)
+    rgb = read_rgb_frames_meta(tmp_path / "rgb/per_frame_timestamps.txt")
+    with Video(tmp_path / "rgb/video.mp4") as video:
+        for meta in rgb.values():
+            frame = video.seek_read_frame(meta.ms)
+            assert frame is not None, meta
+            expected = make_rgb_frame(meta.id, (64, 48)).astype(int)
+            assert np.abs(frame.astype(int) - expected).mean() < 10, meta
+
+
+def test_generate_dataset(tmp_path: Path, config: GeneratorConfig) -> None:
+    generate_dataset(tmp_path, config, workers=2)
+
+    rgb = read_rgb_frames_meta(tmp_path / "rgb/per_frame_timestamps.txt")
+    depth = read_depth_frames_meta(tmp_path / "depth/per_frame_timestamps.txt")
+    obs = read_observations_meta(tmp_path / "touch/per_observation_timestamps.txt")
+    assert len(rgb) == 40
+    assert 0 < len(depth) < 20
+    assert 0 < len(obs) < 10
+
+    with Video(tmp_path / "rgb/video.mp4") as video:
+        assert video.get_fps() == 20
+        assert video.get_frame_size() == (64, 48)
+        frame = video.seek_read_frame(rgb[500].ms)
+    assert frame is not None
+    expected = make_rgb_frame(rgb[500].id, (64, 48)).astype(int)
+    assert np.abs(frame.astype(int) - expected).mean() < 10, "lossy codec"
+
+    for depth_meta in depth.values():
+        expected = make_depth_frame(depth_meta.id, (64, 48)).reshape(-1)
+        assert (load_depth_frame(depth_meta) == expected).all()
+    for obs_meta in obs.values():
+        assert load_observation(obs_meta) == make_observation(obs_meta.id, 3)
+
+
+def test_generate_dataset_deterministic(
+    tmp_path: Path, config: GeneratorConfig
+) -> None:
+    generate_dataset(tmp_path / "a", config, workers=1)
+    generate_dataset(tmp_path / "b", config, workers=2)
+    for rel_path in ("depth/per_frame_timestamps.txt", "touch/observation-000003.txt"):
+        assert (tmp_path / "a" / rel_path).read_text() == (
+            tmp_path / "b" / rel_path
+        ).read_text()
+
+
+def test_generated_dataset_iterable(tmp_path: Path, config: GeneratorConfig) -> None:
+    generate_dataset(tmp_path, config)
+    obs = read_observations_meta(tmp_path / "touch/per_observation_timestamps.txt")
+    items = list(MyDataset(tmp_path))
+    assert [item.touch_timestamp_i for item in items] == list(obs)
+
+
+def test_main(tmp_path: Path) -> None:
+    main(
+        [
+            str(tmp_path),
+            "--rgb-count=10",
+            "--depth-count=5",
+            "--touch-count=3",
+            "--width=32",
+            "--height=16",
+            "--workers=1",
+        ]
+    )
+    assert len(list((tmp_path / "depth").glob("frame-*.png"))) == 5
+    assert len(list((tmp_path / "touch").glob("observation-*.txt"))) == 3
+    assert (tmp_path / "rgb/video.mp4").exists()
+
+
+def test_main_invalid_rgb_jitter(tmp_path: Path) -> None:
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), "--rgb-start-ms=5", "--rgb-jitter-ms=12"])
+    assert not (tmp_path / "rgb").exists()
@@ -0,0 +1,122 @@
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from dataset_loader.dataset_loader import MyDataset, PyAVVideo, Video
+from dataset_loader.generator import GeneratorConfig, StreamSpec, generate_dataset
+from dataset_loader.parallel_decode import ParallelVideoDecoder, Segment, plan_segments
+
+
+@pytest.fixture
+def video_path(dataset_path: Path) -> Path:
+    return dataset_path / "rgb" / "video.mp4"
+
+
+def test_plan_segments_empty() -> None:
+    assert plan_segments([], [0, 10]) == []
+
+
+def test_plan_segments_by_keyframes() -> None:
+    indices = [0, 3, 11, 12, 35, 36, 50]
+    keyframes = [0, 10, 20, 30, 40]
+    assert plan_segments(indices, keyframes, segment_frames=10) == [
+        Segment(start=0, indices=[0, 3]),
+        Segment(start=10, indices=[11, 12]),
+        Segment(start=30, indices=[35, 36]),
+        Segment(start=40, indices=[50]),
+    ]
+
+
+def test_plan_segments_merges_short_gops() -> None:
+    indices = [0, 3, 11, 12, 35, 36, 50]
+    keyframes = [0, 10, 20, 30, 40]
+    assert plan_segments(indices, keyframes, segment_frames=25) == [
+        Segment(start=0, indices=[0, 3, 11, 12]),
+        Segment(start=30, indices=[35, 36, 50]),
+    ]
+
+
+def test_plan_segments_without_keyframes() -> None:
+    assert plan_segments([5, 15, 25, 26], None, segment_frames=10) == [
+        Segment(start=0, indices=[5]),
+        Segment(start=10, indices=[15]),
+        Segment(start=20, indices=[25, 26]),
+    ]
+
+
+def test_plan_segments_first_keyframe_not_zero() -> None:
+    assert plan_segments([1, 20], [10], segment_frames=5) == [
+        Segment(start=0, indices=[1]),
+        Segment(start=10, indices=[20]),
+    ]
+
+
+def test_decode_decreasing_timestamps(video_path: Path) -> None:
+    decoder = ParallelVideoDecoder(video_path, workers=1)
+    with pytest.raises(ValueError, match="must be non-decreasing"):
+        list(decoder.decode([100, 0]))
+
+
+@pytest.mark.parametrize("use_keyframes", [True, False])
+def test_decode_equivalent_to_seek(
+    video_path: Path, monkeypatch: pytest.MonkeyPatch, use_keyframes: bool
+) -> None:
+    if not use_keyframes:
+
+        def no_keyframes(self: PyAVVideo) -> List[int]:
+            raise ValueError("no keyframes")
+
+        monkeypatch.setattr(PyAVVideo, "get_keyframe_indices", no_keyframes)
+
+    ms = [0, 0, 17, 100, 666, 2050, 2051, 4000, 6983, 7000, 100_000]
+    decoder = ParallelVideoDecoder(video_path, workers=2, segment_frames=20)
+    frames = list(decoder.decode(ms))
+    assert len(frames) == len(ms)
+    with Video(video_path) as video:
+        for m, frame in zip(ms, frames):
+            expected = video.seek_read_frame(m)
+            if expected is None:
+                assert frame is None, m
+            else:
+                assert frame is not None, m
+                assert (frame == expected).all(), m
+
+
+def test_decode_many_gops(tmp_path: Path) -> None:
+    pytest.importorskip("av")
+    config = GeneratorConfig(rgb=StreamSpec(count=100, rate=30), frame_size=(32, 16))
+    generate_dataset(tmp_path, config, workers=1)
+    video_path = tmp_path / "rgb" / "video.mp4"
+    with PyAVVideo(video_path) as pyav_video:
+        assert len(pyav_video.get_keyframe_indices()) > 1
+
+    ms = list(range(0, 3_300, 90))
+    decoder = ParallelVideoDecoder(video_path, workers=2, segment_frames=12)
+    with Video(video_path) as video:
+        for m, frame in zip(ms, decoder.decode(ms)):
+            expected = video.seek_read_frame(m)
+            assert expected is not None and frame is not None
+            assert (frame == expected).all(), m
+
+
+def test_dataset_parallel_rgb_decode(
+    dataset_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    reads: List[int] = []
+    read_keyframes = ParallelVideoDecoder._read_keyframes
+
+    def count_reads(self: ParallelVideoDecoder) -> Optional[List[int]]:
+        reads.append(1)
+        return read_keyframes(self)
+
+    monkeypatch.setattr(ParallelVideoDecoder, "_read_keyframes", count_reads)
+    expected = list(MyDataset(dataset_path))
+    ds = MyDataset(dataset_path, rgb_decode_workers=2)
+    for _ in range(2):  # epochs
+        items = list(ds)
+        assert len(items) == len(expected)
+        for item, expected_item in zip(items, expected):
+            assert item.rgb_timestamp_j == expected_item.rgb_timestamp_j
+            assert (item.rgb_j == expected_item.rgb_j).all()
+    assert len(reads) == 1, "the video is demuxed once"
@@ -0,0 +1,116 @@
+from pathlib import Path
+
+import pytest
+from torch.utils.data import DataLoader
+
+from dataset_loader.dataset_loader import MyDataset
+from dataset_loader.parallel_decode import decode_sequential
+from dataset_loader.sampler import BlockShuffleSampler
+
+
+def test_invalid_block_size() -> None:
+    with pytest.raises(ValueError, match="Block size must be positive"):
+        BlockShuffleSampler(0)
+
+
+def test_blocks_cover_all_samples() -> None:
+    sampler = BlockShuffleSampler(4, seed=1)
+    blocks = sampler.blocks(10)
+    assert sorted(len(block) for block in blocks) == [2, 4, 4]
+    assert sorted(i for block in blocks for i in block) == list(range(10))
+
+
+def test_blocks_deterministic_per_seed_and_epoch() -> None:
+    orders = {}
+    for seed in (0, 1):
+        for epoch in (0, 1):
+            sampler = BlockShuffleSampler(2, seed=seed)
+            sampler.set_epoch(epoch)
+            orders[seed, epoch] = sampler.blocks(100)
+            assert sampler.blocks(100) == orders[seed, epoch]
+    assert len({tuple(order) for order in orders.values()}) == 4
+
+
+def test_order_within() -> None:
+    assert BlockShuffleSampler(8).order_within(range(8, 16)) == list(range(8, 16))
+    sampler = BlockShuffleSampler(8, shuffle_within=True)
+    order = sampler.order_within(range(8, 16))
+    assert order != list(range(8, 16))
+    assert sorted(order) == list(range(8, 16))
+
+
+def test_decode_sequential(dataset_path: Path) -> None:
+    ds = MyDataset(dataset_path)
+    items = list(ds)
+    ms = [item.rgb_timestamp_j for item in items] + [1_000_000]
+    frames = decode_sequential(dataset_path / "rgb/video.mp4", ms)
+    assert frames[-1] is None, "beyond the end of the video"
+    for frame, item in zip(frames, items):
+        assert frame is not None
+        assert (frame == item.rgb_j).all()
+
+
+@pytest.mark.parametrize("shuffle_within", [False, True])
+def test_dataset_with_sampler(dataset_path: Path, shuffle_within: bool) -> None:
+    expected = {item.touch_timestamp_i: item for item in MyDataset(dataset_path)}
+    sampler = BlockShuffleSampler(3, seed=7, shuffle_within=shuffle_within)
+    ds = MyDataset(dataset_path, sampler=sampler)
+    items = list(ds)
+    timestamps = [item.touch_timestamp_i for item in items]
+    assert timestamps != sorted(timestamps)
+    assert sorted(timestamps) == sorted(expected)
+    for item in items:
+        assert (item.rgb_j == expected[item.touch_timestamp_i].rgb_j).all()
+        assert (item.depth_k == expected[item.touch_timestamp_i].depth_k).all()
+
+    assert [item.touch_timestamp_i for item in ds] == timestamps, "same epoch"
+    ds.set_epoch(1)
+    assert [item.touch_timestamp_i for item in ds] != timestamps
+
+
+def test_dataset_with_sampler_multiple_workers(dataset_path: Path) -> None:
+    ds = MyDataset(dataset_path, sampler=BlockShuffleSampler(2, seed=3))
+    data = list(DataLoader(ds, batch_size=None, num_workers=2))
+    assert sorted(item.touch_timestamp_i for item in data) == sorted(
+        item.touch_timestamp_i for item in ds
+    )
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+@pytest.mark.parametrize("consumed", [4, 7, 10])
+def test_resume_with_sampler(
+    dataset_path: Path, num_workers: int, consumed: int
+) -> None:
+    def make_dataset() -> MyDataset:
+        sampler = BlockShuffleSampler(3, seed=5, shuffle_within=True)
+        ds = MyDataset(dataset_path, sampler=sampler)
+        ds.set_epoch(2)
+        return ds
+
+    ds = make_dataset()
+    loader = DataLoader(ds, batch_size=None, num_workers=num_workers)
+    expected = [item.touch_timestamp_i for item in loader]
+    state = ds.state_dict(consumed, num_workers=num_workers)
+
+    ds = make_dataset()
+    ds.set_epoch(0)
+    ds.load_state_dict(state)
+    loader = DataLoader(ds, batch_size=None, num_workers=num_workers)
+    assert len(loader) == len(expected) - consumed
+    assert [item.touch_timestamp_i for item in loader] == expected[consumed:]
+
+
+def test_resume_with_another_sampler(dataset_path: Path) -> None:
+    ds = MyDataset(dataset_path, sampler=BlockShuffleSampler(3, seed=5))
+    state = ds.state_dict(4)
+    with pytest.raises(ValueError, match="saved with another sampler"):
+        MyDataset(dataset_path, sampler=BlockShuffleSampler(3)).load_state_dict(state)
+    with pytest.raises(ValueError, match="saved with a sampler"):
+        MyDataset(dataset_path).load_state_dict(state)
+
+
+def test_resume_with_another_number_of_workers(dataset_path: Path) -> None:
+    ds = MyDataset(dataset_path, sampler=BlockShuffleSampler(3))
+    ds.load_state_dict(ds.state_dict(4, num_workers=2))
+    with pytest.raises(ValueError, match="saved with 2 workers, got: 1"):
+        list(ds)
@@ -0,0 +1,110 @@
+import pickle
+from typing import Iterator, NamedTuple
+
+import numpy as np
+import pytest
+
+from dataset_loader.shared_memory import FrameRef, SharedFrameRing
+
+
+class Item(NamedTuple):
+    ms: int
+    rgb: np.ndarray
+    depth: np.ndarray
+
+
+@pytest.fixture
+def item() -> Item:
+    return Item(
+        ms=100,
+        rgb=np.arange(24, dtype=np.uint8).reshape(2, 4, 3),
+        depth=np.arange(8, dtype=np.int64),
+    )
+
+
+def test_invalid_number_of_workers() -> None:
+    with pytest.raises(ValueError, match="Expect positive number of workers"):
+        SharedFrameRing(100, num_workers=0)
+
+
+def test_put_resolve(item: Item) -> None:
+    with SharedFrameRing(1024, num_workers=1) as ring:
+        shared = ring.put(0, item)
+        assert shared.ms == 100
+        assert isinstance(shared.rgb, FrameRef)
+        assert isinstance(shared.depth, FrameRef)
+        assert shared.rgb.slot == shared.depth.slot == 0
+
+        resolved = ring.resolve(shared)
+        assert resolved.ms == 100
+        assert (resolved.rgb == item.rgb).all()
+        assert resolved.rgb.dtype == np.uint8
+        assert (resolved.depth == item.depth).all()
+        assert resolved.depth.dtype == np.int64
+
+
+def test_put_too_large(item: Item) -> None:
+    with SharedFrameRing(64, num_workers=1) as ring:
+        with pytest.raises(ValueError, match="slot size is 64"):
+            ring.put(0, item)
+
+
+def test_put_unknown_worker(item: Item) -> None:
+    with SharedFrameRing(1024, num_workers=2) as ring:
+        with pytest.raises(ValueError, match="exceeds the number of workers"):
+            ring.put(2, item)
+
+
+def test_pickled_ring_shares_memory(item: Item) -> None:
+    with SharedFrameRing(1024, num_workers=1) as ring:
+        worker_ring = pickle.loads(pickle.dumps(ring))
+        shared = worker_ring.put(0, item)
+        worker_ring.close()
+        assert ring._path.exists(), "only the owner removes the file"
+        assert (ring.resolve(shared).rgb == item.rgb).all()
+
+
+def test_consume_releases_slots(item: Item) -> None:
+    with SharedFrameRing(1024, num_workers=1, slots_per_worker=2) as ring:
+
+        def produce() -> Iterator[Item]:
+            for ms in range(5):
+                # blocks forever if the consumed slots are not released
+                yield ring.put(0, item._replace(ms=ms))
+
+        consumed = [(it.ms, it.depth.sum()) for it in ring.consume(produce())]
+        assert consumed == [(ms, 28) for ms in range(5)]
+        assert ring._states is not None
+        assert (ring._states == 0).all()
+
+
+def test_acquire_timeout(item: Item) -> None:
+    with SharedFrameRing(1024, num_workers=2, slots_per_worker=1, timeout=0.01) as ring:
+        ring.put(1, item)
+        with pytest.raises(RuntimeError, match="Worker 1 waited .* slot 1"):
+            ring.put(1, item)
+
+
+def test_consume_busy_slots(item: Item) -> None:
+    with SharedFrameRing(1024, num_workers=1, slots_per_worker=2) as ring:
+
+        def produce() -> Iterator[Item]:
+            yield ring.put(0, item)
+            yield ring.put(0, item)
+
+        items = produce()
+        next(ring.consume(items))
+        next(items)  # prefetched, but the iteration is interrupted
+        with pytest.raises(RuntimeError, match=r"Slots \[1\] are busy"):
+            next(ring.consume(produce()))
+
+        ring.reset()
+        assert [it.ms for it in ring.consume(produce())] == [100, 100]
+
+
+def test_close_removes_file() -> None:
+    ring = SharedFrameRing(1024, num_workers=1)
+    path = ring._path
+    assert path.exists()
+    ring.close()
+    assert not path.exists()
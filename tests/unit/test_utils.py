@@ -1,6 +1,14 @@
+from typing import List
+
+import numpy as np
 import pytest
 
-from dataset_loader.utils import zip_closest
+from dataset_loader.utils import (
+    align_closest,
+    linearize_timeline,
+    round_robin_offsets,
+    zip_closest,
+)
 
 
 @pytest.mark.parametrize("linearize", [True, False])
@@ -208,3 +216,61 @@ def test_zip_closest_linearize_complex_join_three() -> None:
         ((6, 5), (6, 7), (6, 5)),
         ((7, 5), (7, 7), (7, 8)),
     ]
+
+
+@pytest.mark.parametrize("linearize", [True, False])
+def test_align_closest_same_as_zip_closest(linearize: bool) -> None:
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        main = np.unique(rng.integers(0, 200, size=rng.integers(0, 20))).tolist()
+        secondaries = [
+            np.unique(rng.integers(0, 200, size=rng.integers(1, 20))).tolist()
+            for _ in range(3)
+        ]
+        timeline, indices = align_closest(
+            main, secondaries, linearize=linearize, step=7
+        )
+        for secondary, positions in zip(secondaries, indices):
+            expected = list(zip_closest(main, secondary, linearize=linearize, step=7))
+            combined = list(zip(timeline.tolist(), np.take(secondary, positions)))
+            assert combined == expected
+
+
+def test_align_closest_nonempty_main_empty_secondary() -> None:
+    with pytest.raises(
+        ValueError, match="Got empty secondary sequence with non-empty main sequence"
+    ):
+        align_closest([1, 2, 3], [[1], []])
+
+
+def test_align_closest_linearize_requires_step() -> None:
+    with pytest.raises(ValueError, match="Option 'linearize' requires 'step' defined"):
+        align_closest([1, 2, 3], [[1]], linearize=True, step=None)
+
+
+def test_align_closest_no_secondaries() -> None:
+    timeline, indices = align_closest([1, 2, 3], [])
+    assert timeline.tolist() == [1, 2, 3]
+    assert indices.shape == (0, 3)
+
+
+@pytest.mark.parametrize("main", [[], [5], [1, 2, 3]])
+def test_linearize_timeline_no_gaps(main: List[int]) -> None:
+    assert linearize_timeline(main, 10).tolist() == main
+
+
+def test_round_robin_offsets() -> None:
+    lengths = [3, 1, 2]
+    taken = [0, 0, 0]
+    for consumed in range(sum(lengths) + 1):
+        assert round_robin_offsets(lengths, consumed) == taken
+        # take the next element in turns, skipping exhausted sequences
+        for i in sorted(range(3), key=lambda i: (taken[i], i)):
+            if taken[i] < lengths[i]:
+                taken[i] += 1
+                break
+
+
+def test_round_robin_offsets_too_many_consumed() -> None:
+    with pytest.raises(ValueError, match=r"must be in \[0, 4\], got: 5"):
+        round_robin_offsets([3, 1], 5)
@@ -0,0 +1,157 @@
+import json
+import shutil
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+from dataset_loader.dataset_loader import (
+    DEPTH_META_REL_PATH,
+    MyDataset,
+    read_depth_frames_meta,
+)
+from dataset_loader import validate
+from dataset_loader.validate import (
+    ALIGNMENT_FILE_NAME,
+    main,
+    validate_recording,
+    validate_recordings,
+)
+
+
+@pytest.fixture
+def dataset_copy(dataset_path: Path, tmp_path: Path) -> Path:
+    path = tmp_path / "copy"
+    shutil.copytree(dataset_path, path)
+    return path
+
+
+def test_validate_recording_ok(dataset_path: Path) -> None:
+    report = validate_recording(dataset_path)
+    assert report.ok, report.errors
+    assert report.rgb_frames == 70
+    assert report.depth_frames == 17
+    assert report.observations == 10
+    assert report.video_frames == 210
+    assert report.samples == len(MyDataset(dataset_path))
+    assert report.alignment_path is None
+    assert report.warnings == [
+        f"Video file `{dataset_path / 'rgb/video.mp4'}` has 210 frames, "
+        "rgb meta file has 70"
+    ]
+
+
+def test_validate_recording_save_alignment(dataset_copy: Path) -> None:
+    report = validate_recording(dataset_copy, linearize=True, save_alignment=True)
+    assert report.ok, report.errors
+    assert report.alignment_path == str(dataset_copy / ALIGNMENT_FILE_NAME)
+
+    ds = MyDataset(dataset_copy, linearize=True)
+    expected = [
+        (item.touch_timestamp_i, item.rgb_timestamp_j, item.depth_timestamp_k)
+        for item in ds
+    ]
+    with np.load(report.alignment_path) as alignment:
+        actual = np.stack(
+            [alignment["touch_ms"], alignment["rgb_ms"], alignment["depth_ms"]], 1
+        )
+    assert actual.tolist() == [list(t) for t in expected]
+
+
+def test_validate_recording_invalid_meta_line(dataset_copy: Path) -> None:
+    meta_file = dataset_copy / "depth" / "per_frame_timestamps.txt"
+    meta_file.write_text(meta_file.read_text() + "\n123 -1\n")
+    report = validate_recording(dataset_copy)
+    assert not report.ok
+    assert report.samples is None, "not aligned"
+    assert len(report.errors) == 1
+    assert "2nd element must be a positive int" in report.errors[0]
+
+
+def test_validate_recording_not_increasing(dataset_copy: Path) -> None:
+    meta_file = dataset_copy / "rgb" / "per_frame_timestamps.txt"
+    meta_file.write_text(meta_file.read_text() + "\n5 70\n")
+    report = validate_recording(dataset_copy)
+    assert report.errors == [
+        f"Invalid rgb frames meta file `{meta_file}`: line 71: "
+        "timestamps must be increasing, got 5 after 6899"
+    ]
+
+
+def test_validate_recording_duplicated_line(dataset_copy: Path) -> None:
+    meta_file = dataset_copy / "touch" / "per_observation_timestamps.txt"
+    meta_file.write_text(meta_file.read_text() + "\n000006600 000009\n")
+    report = validate_recording(dataset_copy)
+    assert len(report.errors) == 1
+    assert "got 6600 after 6600" in report.errors[0]
+
+
+def test_validate_recording_missing_files(dataset_copy: Path) -> None:
+    meta = read_depth_frames_meta(dataset_copy / DEPTH_META_REL_PATH)
+    path = next(iter(meta.values())).file_path
+    path.unlink()
+    report = validate_recording(dataset_copy)
+    assert report.errors == [
+        f"Missing 1 depth frame files in `{path.parent}`: {path.name}"
+    ]
+
+
+def test_validate_recording_frames_beyond_video(dataset_copy: Path) -> None:
+    meta_file = dataset_copy / "rgb" / "per_frame_timestamps.txt"
+    meta_file.write_text(meta_file.read_text() + "\n60000 70\n")
+    report = validate_recording(dataset_copy)
+    assert len(report.errors) == 1
+    assert "has 210 frames, rgb timestamp 60000 ms" in report.errors[0]
+
+
+def test_validate_recording_same_video_frame(dataset_copy: Path) -> None:
+    meta_file = dataset_copy / "rgb" / "per_frame_timestamps.txt"
+    meta_file.write_text(meta_file.read_text() + "\n6910 70\n")
+    report = validate_recording(dataset_copy)
+    assert len(report.errors) == 1
+    assert "6899 and 6910 ms refer to the same frame 207" in report.errors[0]
+
+
+def test_validate_recording_missing_video(dataset_copy: Path) -> None:
+    (dataset_copy / "rgb" / "video.mp4").unlink()
+    report = validate_recording(dataset_copy)
+    assert not report.ok
+    assert report.video_frames is None
+
+
+def test_validate_recordings(dataset_path: Path, dataset_copy: Path) -> None:
+    (dataset_copy / "touch" / "per_observation_timestamps.txt").unlink()
+    reports = validate_recordings([dataset_path, dataset_copy], workers=2)
+    assert [report.root for report in reports] == [
+        str(dataset_path),
+        str(dataset_copy),
+    ]
+    assert [report.ok for report in reports] == [True, False]
+
+
+def test_validate_recordings_exception(
+    dataset_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail(*args: Any, **kwargs: Any) -> None:
+        raise RuntimeError("unexpected")
+
+    monkeypatch.setattr(validate, "align_closest", fail)
+    report = validate._validate_or_fail(dataset_path, linearize=True)
+    assert report.root == str(dataset_path)
+    assert report.errors == ["RuntimeError: unexpected"]
+
+
+def test_main(dataset_path: Path, dataset_copy: Path, tmp_path: Path) -> None:
+    output = tmp_path / "report.json"
+    argv = [str(dataset_path), "--workers", "1", "--output", str(output)]
+    assert main(argv) == 0
+    result = json.loads(output.read_text())
+    assert (result["valid"], result["invalid"]) == (1, 0)
+    assert result["recordings"][0]["ok"]
+
+    (dataset_copy / "rgb" / "per_frame_timestamps.txt").write_text("1 2 3\n")
+    assert main([str(dataset_path), str(dataset_copy), "--output", str(output)]) == 1
+    result = json.loads(output.read_text())
+    assert (result["valid"], result["invalid"]) == (1, 1)
+    assert result["recordings"][1]["errors"]